@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_clean import CSV_COLUMNS, read_dataset, clean_data_fast
+
+SOURCE_CSV = 'dataset/reviews_data.csv'
+SORTS = ['rating', 'price_asc', 'price_desc']
+
+# Search shapes: a city alone (served from restaurant_top_n), a city and a
+# food type (trigram filters on restaurants), and the first PAGE_DEPTH pages
+# of a city search through search_page (cached first page, keyset after it)
+SEARCH_CASES = ['city', 'type', 'pages']
+PAGE_DEPTH = 3
+
+def synthesize(source_csv, out_path, rows, seed=0, chunk_size=100000):
+    """Write a CSV of rows restaurants drawn from the source file's distributions.
+    
+    City-bound fields (city, location, phone, URLs) are taken together from
+    one source row so they stay consistent; cuisine combination, price
+    range, rating and review count are each sampled from their own
+    empirical distribution. Output is in the raw source format.
+    """
+    rng = np.random.default_rng(seed)
+    raw = pd.read_csv(source_csv, sep=';', dtype=str)
+    counts = clean_data_fast(read_dataset(source_csv))['No of Reviews'].to_numpy()
+    
+    def empirical(column):
+        freq = raw[column].value_counts(normalize=True, dropna=False)
+        return freq.index.to_numpy(dtype=object), freq.to_numpy()
+    
+    types, type_p = empirical('Type')
+    prices, price_p = empirical('Price_Range')
+    ratings, rating_p = empirical('Reviews')
+    
+    written = 0
+    with open(out_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(';'.join(CSV_COLUMNS) + '\n')
+        while written < rows:
+            n = min(chunk_size, rows - written)
+            base = raw.iloc[rng.integers(0, len(raw), n)].reset_index(drop=True)
+            ids = np.arange(written, written + n)
+            # Review counts keep the source's long tail, jittered so values vary
+            review_counts = np.maximum(
+                0, (rng.choice(counts, n) * rng.lognormal(0, 0.3, n)).astype(np.int64))
+            chunk = pd.DataFrame({
+                'Name': base['Name'] + ' #' + ids.astype(str),
+                'Street Address': rng.integers(1, 10000, n).astype(str) + ' '
+                                  + base['Street Address'].str.split(' ', n=1).str[-1],
+                'Location': base['Location'],
+                'Type': rng.choice(types, n, p=type_p),
+                'Reviews': rng.choice(ratings, n, p=rating_p),
+                'No of Reviews': [f"{c:,} reviews" for c in review_counts],
+                'Contact Number': base['Contact Number'],
+                'Trip_advisor Url': base['Trip_advisor Url'],
+                'Menu': base['Menu'],
+                'Price_Range': rng.choice(prices, n, p=price_p),
+                'City': base['City'],
+            })
+            chunk.to_csv(f, sep=';', header=False, index=False)
+            written += n
+    return out_path
+
+def run_import(csv_path, method, extra_args=()):
+    """Run data_import.py in a child process and measure it.
+    
+    Peak RSS comes from RUSAGE_CHILDREN, which only keeps the largest child
+    reaped so far, so every import is started from a fresh helper process.
+    """
+    with ProcessPoolExecutor(max_workers=1) as helper:
+        return helper.submit(_measure_import, csv_path, method, tuple(extra_args)).result()
+
+def _measure_import(csv_path, method, extra_args):
+    cmd = [sys.executable, 'data_import.py', '--csv', csv_path, '--method', method,
+           '--no-cache', *extra_args]
+    with open(csv_path, 'rb') as f:
+        rows = sum(1 for _ in f) - 1
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.communicate()[0].decode('utf-8', 'replace')
+    elapsed = time.perf_counter() - start
+    # The import and any workers it started are all reaped by now
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'csv': csv_path,
+        'method': method,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else None,
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'exit_status': proc.returncode,
+        'succeeded': (proc.returncode == 0 and 'Imported' in output
+                      and 'error' not in output.lower()),
+    }
+
+def latency_summary(latencies):
+    """Percentiles in milliseconds"""
+    ms = np.asarray(latencies) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+def run_search(search, targets, sort, concurrency, queries, seed=0):
+    """Fire queries searches from concurrency threads and record latencies.
+    
+    targets is an array of (city, food_type) pairs to draw the searches from.
+    """
+    rng = np.random.default_rng(seed)
+    picks = targets[rng.integers(0, len(targets), queries)]
+    
+    def one(target):
+        city, food_type = target
+        start = time.perf_counter()
+        search(city, food_type, sort)
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, picks))
+    elapsed = time.perf_counter() - start
+    result = {'sort': sort, 'concurrency': concurrency,
+              'queries_per_second': queries / elapsed}
+    result.update(latency_summary(latencies))
+    return result
+
+def make_search_backend(backend, csv_path, max_connections, use_cache):
+    """Return ({case: search callable}, close callable) for the chosen backend.
+    
+    Search callables take (city, food_type, sort). The memory backend has
+    no paging, so it offers no 'pages' case.
+    """
+    if backend == 'memory':
+        from memory_search import InMemorySearch
+        engine = InMemorySearch.from_csv(csv_path)
+        search = engine.search
+        pages, close = None, lambda: None
+    else:
+        from restaurant_ui import RestaurantUI
+        # A zero-sized cache evicts every entry immediately
+        ui = RestaurantUI(max_connections=max_connections, cache_size=1024 if use_cache else 0)
+        search, close = ui.get_restaurants, ui.close_db
+        
+        def pages(city, food_type, sort):
+            token = None
+            for _ in range(PAGE_DEPTH):
+                _, token = ui.search_page(city, None, sort, 10, token)
+                if token is None:
+                    break
+    
+    def by_city(city, food_type, sort):
+        return search(city, None, sort, 10)
+    
+    def by_type(city, food_type, sort):
+        return search(city, food_type, sort, 10)
+    
+    cases = {'city': by_city, 'type': by_type}
+    if pages is not None:
+        cases['pages'] = pages
+    return cases, close
+
+def metadata(args):
+    """Run description stored next to the results"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': {k: v for k, v in vars(args).items() if k != 'func'},
+    }
+
+def cmd_synth(args):
+    os.makedirs(args.out_dir, exist_ok=True)
+    for rows in args.rows:
+        path = os.path.join(args.out_dir, f"reviews_{rows}.csv")
+        start = time.perf_counter()
+        synthesize(args.source, path, rows, args.seed)
+        print(f"Wrote {rows} rows to {path} in {time.perf_counter() - start:.1f}s")
+    return {}
+
+def cmd_import(args):
+    results = []
+    for csv_path in args.csv:
+        for method in args.methods:
+            result = run_import(csv_path, method)
+            print(f"{method:>11} {result['rows']:>10} rows  {result['rows_per_second']:>10.0f} rows/s  "
+                  f"{result['peak_rss_mb']:>8.1f} MB peak RSS"
+                  + ("" if result['succeeded'] else "  FAILED"))
+            results.append(result)
+    return {'import': results}
+
+def search_targets(csv_path, seed):
+    """(city, food_type) pairs from the dataset; the type is a row's first cuisine"""
+    df = read_dataset(csv_path, usecols=['City', 'Type']).dropna()
+    df = df.sample(min(len(df), 10000), random_state=seed)
+    cities = df['City'].astype(str).str.strip()
+    food_types = df['Type'].astype(str).str.split(',').str[0].str.strip()
+    return np.array(list(zip(cities, food_types)), dtype=object)
+
+def cmd_search(args):
+    cases, close = make_search_backend(args.backend, args.csv, max(args.concurrency),
+                                       args.with_cache)
+    targets = search_targets(args.csv, args.seed)
+    results = []
+    try:
+        for case in args.cases:
+            if case not in cases:
+                print(f"{case:>6} not supported by the {args.backend} backend, skipped")
+                continue
+            for sort in SORTS:
+                for concurrency in args.concurrency:
+                    result = run_search(cases[case], targets, sort, concurrency,
+                                        args.queries, args.seed)
+                    result['backend'] = args.backend
+                    result['case'] = case
+                    print(f"{case:>6} {sort:>10} x{concurrency:<3} "
+                          f"{result['queries_per_second']:>9.0f} q/s  "
+                          f"p50 {result['p50_ms']:.2f}ms  p99 {result['p99_ms']:.2f}ms")
+                    results.append(result)
+    finally:
+        close()
+    return {'search': results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and search benchmarks")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    sub = parser.add_subparsers(required=True)
+    
+    synth = sub.add_parser('synth', help="generate synthetic datasets")
+    synth.add_argument('--source', default=SOURCE_CSV)
+    synth.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    synth.add_argument('--out-dir', default='bench_data')
+    synth.add_argument('--seed', type=int, default=0)
+    synth.set_defaults(func=cmd_synth)
+    
+    imp = sub.add_parser('import', help="measure import throughput and peak memory")
+    imp.add_argument('--csv', nargs='+', required=True)
+    imp.add_argument('--methods', nargs='+', default=['values', 'copy', 'parallel'],
+                     choices=['values', 'copy', 'parallel', 'incremental'])
+    imp.set_defaults(func=cmd_import)
+    
+    search = sub.add_parser('search', help="measure search latency per case, sort order and concurrency")
+    search.add_argument('--csv', default=SOURCE_CSV, help="dataset the queried cities come from")
+    search.add_argument('--backend', choices=['db', 'memory'], default='db')
+    search.add_argument('--cases', nargs='+', choices=SEARCH_CASES, default=SEARCH_CASES)
+    search.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    search.add_argument('--queries', type=int, default=500, help="queries per sort and concurrency")
+    search.add_argument('--with-cache', action='store_true', help="keep the search result cache on")
+    search.add_argument('--seed', type=int, default=0)
+    search.set_defaults(func=cmd_search)
+    
+    args = parser.parse_args(argv)
+    results = args.func(args)
+    if args.output and results:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(args), **results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
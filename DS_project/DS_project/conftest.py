@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+@pytest.fixture(scope='session')
+def ui():
+    """RestaurantUI on a loaded database, or skip.
+    
+    Connects with RESTAURANT_TEST_DSN when set, otherwise with the
+    RestaurantUI defaults.
+    """
+    psycopg2 = pytest.importorskip('psycopg2')
+    pytest.importorskip('tabulate')
+    from restaurant_ui import RestaurantUI
+    
+    ui = RestaurantUI()
+    if os.environ.get('RESTAURANT_TEST_DSN'):
+        ui.db_params = {'dsn': os.environ['RESTAURANT_TEST_DSN']}
+    try:
+        conn = psycopg2.connect(**ui.db_params)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database not available: {e}")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('restaurants'), to_regclass('restaurant_top_n')")
+            if None in cur.fetchone():
+                pytest.skip("restaurants tables not loaded; run data_import.py first")
+    finally:
+        conn.close()
+    yield ui
+    ui.close_db()
@@ -2,45 +2,76 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
 import os
+import io
+import hashlib
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
-def clean_data(df):
-    """Clean and prepare the data for import"""
-    # Remove any leading/trailing whitespace
-    df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-    
-    # Clean the 'No of Reviews' column by extracting just the number
-    df['No of Reviews'] = df['No of Reviews'].str.extract('(\d+)').fillna(0).astype(int)
-    
-    # Clean the 'Reviews' column to be a float
-    df['Reviews'] = pd.to_numeric(df['Reviews'], errors='coerce')
-    
-    # Replace NaN values in 'Reviews' with a default value
-    df['Reviews'] = df['Reviews'].fillna(0.0)
-    
-    # Ensure price range is standardized
-    df['Price_Range'] = df['Price_Range'].fillna('Not Available')
-    
-    # Clean up the Type column by removing extra spaces
-    df['Type'] = df['Type'].str.strip()
+from data_clean import CSV_COLUMNS, read_dataset, load_dataset, clean_data_fast
+from instrumentation import metrics
+from sort_orders import SORT_ORDERS, TOP_N
+
+# Columns of the restaurants table, in the order the loaders write them
+TABLE_COLUMNS = [
+    'id', 'name', 'street_address', 'location', 'type', 'rating',
+    'review_count', 'contact_number', 'trip_advisor_url',
+    'menu', 'price_range', 'city', 'source_key', 'content_hash', 'created_at'
+]
+
+# Fingerprinted frame columns feeding TABLE_COLUMNS between id and created_at
+FRAME_COLUMNS = CSV_COLUMNS + ['source_key', 'content_hash']
+
+# Rows per chunk for the streaming COPY loader
+DEFAULT_CHUNK_SIZE = 50000
+
+def _as_text(s):
+    """Render a column as strings with missing values as ''"""
+    return s.astype(object).where(s.notna(), '').astype(str)
+
+def _digest(values):
+    """Hash a sequence of field values into a hex string"""
+    return hashlib.md5('\x1f'.join(map(str, values)).encode('utf-8')).hexdigest()
+
+def add_fingerprints(df):
+    """Add the source_key and content_hash columns to a cleaned frame.
     
+    source_key identifies a restaurant by name and street address,
+    content_hash changes whenever any of its imported fields change.
+    """
+    df = df.copy()
+    text = {col: _as_text(df[col]) for col in CSV_COLUMNS}
+    df['source_key'] = [
+        _digest(key) for key in zip(text['Name'], text['Street Address'])
+    ]
+    df['content_hash'] = [
+        _digest(row) for row in zip(*(text[col] for col in CSV_COLUMNS))
+    ]
     return df
 
-def create_table(conn):
-    """Create the restaurants table in TimescaleDB"""
+def create_table(conn, drop=True):
+    """Create the restaurants table in TimescaleDB
+    
+    With drop=False an existing table and its rows are kept, which is what
+    the incremental import relies on.
+    """
     with conn.cursor() as cur:
         try:
             # First, check if TimescaleDB extension is enabled
             cur.execute("CREATE EXTENSION IF NOT EXISTS timescaledb;")
+            # Trigram indexes back the substring searches
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
             conn.commit()
             
             # Drop the table if it exists
-            cur.execute("DROP TABLE IF EXISTS restaurants;")
-            conn.commit()
+            if drop:
+                cur.execute("DROP TABLE IF EXISTS restaurants;")
+                conn.commit()
             
             # Create the base table without primary key constraint
             cur.execute("""
-                CREATE TABLE restaurants (
+                CREATE TABLE IF NOT EXISTS restaurants (
                     id INTEGER,
                     name VARCHAR(255),
                     street_address VARCHAR(255),
@@ -56,6 +87,42 @@ def create_table(conn):
                     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 );
             """)
+            
+            # Columns added since the original schema, which also brings
+            # tables from earlier runs up to date:
+            #   source_key, content_hash: fingerprints for incremental imports
+            #   city_key, type_key: lowercase copies for indexed ILIKE searches
+            #   cuisines: the comma separated type split into lowercase tokens
+            #   price_rank: price_range as a sortable ordinal, unknown values last
+            cur.execute(r"""
+                ALTER TABLE restaurants
+                ADD COLUMN IF NOT EXISTS source_key CHAR(32),
+                ADD COLUMN IF NOT EXISTS content_hash CHAR(32),
+                ADD COLUMN IF NOT EXISTS city_key TEXT
+                    GENERATED ALWAYS AS (lower(city)) STORED,
+                ADD COLUMN IF NOT EXISTS type_key TEXT
+                    GENERATED ALWAYS AS (lower(type)) STORED,
+                ADD COLUMN IF NOT EXISTS cuisines TEXT[]
+                    GENERATED ALWAYS AS (regexp_split_to_array(lower(type), '\s*,\s*')) STORED,
+                ADD COLUMN IF NOT EXISTS price_rank SMALLINT
+                    GENERATED ALWAYS AS (CASE price_range
+                                             WHEN '$' THEN 1
+                                             WHEN '$$ - $$$' THEN 2
+                                             WHEN '$$$$' THEN 3
+                                             ELSE 4
+                                         END) STORED;
+            """)
+            conn.commit()
+            
+            # Ids come from a sequence so concurrent writers never collide;
+            # bulk loaders assign ids themselves and then call sync_id_sequence.
+            # Rows kept from a run before the sequence existed are caught up here
+            cur.execute("CREATE SEQUENCE IF NOT EXISTS restaurants_id_seq;")
+            cur.execute("""
+                ALTER TABLE restaurants
+                ALTER COLUMN id SET DEFAULT nextval('restaurants_id_seq');
+            """)
+            _sync_id_sequence(cur)
             conn.commit()
             
             # Convert to TimescaleDB hypertable
@@ -68,14 +135,50 @@ def create_table(conn):
             
             # Create a non-unique index on id and created_at
             cur.execute("""
-                CREATE INDEX idx_restaurants_id_created 
+                CREATE INDEX IF NOT EXISTS idx_restaurants_id_created 
                 ON restaurants (id, created_at DESC);
             """)
             
-            # Create an index on city for better query performance
+            # Substring searches on city and type use trigram indexes; the
+            # plain btree on city could not serve a leading wildcard
+            cur.execute("DROP INDEX IF EXISTS idx_restaurants_city;")
             cur.execute("""
-                CREATE INDEX idx_restaurants_city 
-                ON restaurants (city, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_restaurants_city_trgm
+                ON restaurants USING gin (city_key gin_trgm_ops);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_type_trgm
+                ON restaurants USING gin (type_key gin_trgm_ops);
+            """)
+            
+            # Whole-cuisine lookups
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_cuisines
+                ON restaurants USING gin (cuisines);
+            """)
+            
+            # One index per sort order, so a city's top rows are an index range;
+            # the trailing id matches the keyset pagination order
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_city_rating
+                ON restaurants (city_key, rating DESC, review_count DESC, id DESC);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_city_price_asc
+                ON restaurants (city_key, price_rank, rating DESC, id DESC);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_city_price_desc
+                ON restaurants (city_key, price_rank DESC, rating DESC, id DESC);
+            """)
+            conn.commit()
+            
+            create_top_n(cur)
+            
+            # Lookup of imported rows by fingerprint key
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_source_key
+                ON restaurants (source_key);
             """)
             conn.commit()
             
@@ -86,8 +189,132 @@ def create_table(conn):
             conn.rollback()
             raise e
 
+def create_top_n(cur):
+    """Create the per-city top-N table and the function that refreshes it.
+    
+    restaurant_top_n keeps the first TOP_N rows of every city for each sort
+    order offered by RestaurantUI. refresh_restaurant_top_n(cities) rebuilds
+    the given city keys (all cities when NULL) from the per-sort indexes, so
+    a write only costs a few index range scans for its own city. Refreshes
+    of the same city are serialized with transaction-level advisory locks.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS restaurant_top_n (
+            sort_key TEXT NOT NULL,
+            city_key TEXT,
+            row_rank INTEGER NOT NULL,
+            name VARCHAR(255),
+            rating FLOAT,
+            review_count INTEGER,
+            type VARCHAR(255),
+            price_range VARCHAR(50),
+            street_address VARCHAR(255),
+            location VARCHAR(255),
+            contact_number VARCHAR(50),
+            trip_advisor_url TEXT,
+            price_rank SMALLINT,
+            id INTEGER
+        );
+    """)
+    # id is the sort orders' final tiebreaker; tables from earlier runs lack it
+    cur.execute("ALTER TABLE restaurant_top_n ADD COLUMN IF NOT EXISTS id INTEGER;")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_restaurant_top_n
+        ON restaurant_top_n (sort_key, city_key, row_rank);
+    """)
+    # Searches match city_key with LIKE '%...%', which only a trigram index serves
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_restaurant_top_n_city_trgm
+        ON restaurant_top_n USING gin (city_key gin_trgm_ops);
+    """)
+    
+    ranked = """
+        SELECT '{sort_key}', c.city_key, t.*
+        FROM target c, LATERAL (
+            SELECT ROW_NUMBER() OVER ({order}), name, rating, review_count,
+                   type, price_range, street_address, location,
+                   contact_number, trip_advisor_url, price_rank, id
+            FROM restaurants r
+            WHERE r.city_key = c.city_key
+            {order}
+            LIMIT {top_n}
+        ) t
+    """
+    selects = " UNION ALL ".join(
+        ranked.format(sort_key=key, order=order, top_n=TOP_N)
+        for key, order in SORT_ORDERS.items()
+    )
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION refresh_restaurant_top_n(cities TEXT[] DEFAULT NULL)
+        RETURNS void LANGUAGE sql AS $$
+            -- One refresh per city at a time, locked in a fixed order. The
+            -- DELETE below runs with a snapshot taken after the lock, so it
+            -- sees the rows a concurrent refresh of the same city inserted
+            SELECT pg_advisory_xact_lock(hashtext(city_key))
+            FROM (
+                SELECT DISTINCT city_key FROM restaurants WHERE cities IS NULL
+                UNION
+                SELECT unnest(cities) WHERE cities IS NOT NULL
+                ORDER BY 1
+            ) locked;
+            
+            DELETE FROM restaurant_top_n
+            WHERE cities IS NULL OR city_key = ANY(cities);
+            
+            INSERT INTO restaurant_top_n (
+                sort_key, city_key, row_rank, name, rating, review_count,
+                type, price_range, street_address, location,
+                contact_number, trip_advisor_url, price_rank, id
+            )
+            WITH target AS (
+                SELECT DISTINCT city_key FROM restaurants WHERE cities IS NULL
+                UNION
+                SELECT unnest(cities) WHERE cities IS NOT NULL
+            )
+            {selects};
+        $$;
+    """)
+
+def _sync_id_sequence(cur):
+    """Move restaurants_id_seq past the largest id in the table, never backwards.
+    
+    Ids drawn by writers that have not committed yet are not in MAX(id),
+    so the sequence only moves when the table is ahead of it.
+    """
+    cur.execute("""
+        SELECT setval('restaurants_id_seq', t.max_id, TRUE)
+        FROM restaurants_id_seq s, (SELECT MAX(id) AS max_id FROM restaurants) t
+        WHERE t.max_id > s.last_value OR (t.max_id = s.last_value AND NOT s.is_called);
+    """)
+
+def sync_id_sequence(conn):
+    """Continue the id sequence after ids assigned by a loader"""
+    with conn.cursor() as cur:
+        try:
+            _sync_id_sequence(cur)
+            conn.commit()
+        except Exception as e:
+            print(f"Error in sync_id_sequence: {e}")
+            conn.rollback()
+            raise e
+
+def refresh_top_n(conn):
+    """Rebuild restaurant_top_n for every city after a load"""
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SELECT refresh_restaurant_top_n();")
+            conn.commit()
+            print("Per-city rankings refreshed")
+        except Exception as e:
+            print(f"Error in refresh_top_n: {e}")
+            conn.rollback()
+            raise e
+
 def import_data(conn, df):
     """Import the cleaned data into TimescaleDB"""
+    df = add_fingerprints(df)
+    # Missing values of any dtype go to the database as NULL
+    df = df.astype(object).where(df.notna(), None)
     with conn.cursor() as cur:
         try:
             # Prepare the data as a list of tuples
@@ -104,6 +331,8 @@ def import_data(conn, df):
                  row['Menu'], 
                  row['Price_Range'], 
                  row['City'],
+                 row['source_key'],
+                 row['content_hash'],
                  datetime.now())
                 for idx, (_, row) in enumerate(df.iterrows(), start=1)
             ]
@@ -113,19 +342,294 @@ def import_data(conn, df):
                 INSERT INTO restaurants (
                     id, name, street_address, location, type, rating, 
                     review_count, contact_number, trip_advisor_url,
-                    menu, price_range, city, created_at
+                    menu, price_range, city, source_key, content_hash,
+                    created_at
                 ) VALUES %s;
             """, values)
             
             conn.commit()
             print(f"Imported {len(values)} records successfully")
+            return len(values)
             
         except Exception as e:
             print(f"Error in import_data: {e}")
             conn.rollback()
             raise e
 
-def main():
+def iter_clean_chunks(csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read the CSV in bounded chunks and clean each one"""
+    for chunk in read_dataset(csv_path, chunksize=chunk_size):
+        yield clean_data_fast(chunk)
+
+def copy_chunk(cur, df, start_id, created_at, table='restaurants'):
+    """Send one cleaned chunk to the restaurants table via COPY"""
+    if 'source_key' not in df:
+        df = add_fingerprints(df)
+    
+    # Lay the chunk out in table column order, ids continue from start_id
+    out = df[FRAME_COLUMNS].copy()
+    out.insert(0, 'id', range(start_id, start_id + len(out)))
+    out['created_at'] = created_at
+    
+    buf = io.StringIO()
+    out.to_csv(buf, header=False, index=False)
+    buf.seek(0)
+    
+    cur.copy_expert(f"""
+        COPY {table} ({', '.join(TABLE_COLUMNS)})
+        FROM STDIN WITH (FORMAT csv);
+    """, buf)
+    return len(out)
+
+def import_data_copy(conn, chunks):
+    """Stream cleaned chunks into TimescaleDB with COPY ... FROM STDIN"""
+    with conn.cursor() as cur:
+        try:
+            total = 0
+            start = time.perf_counter()
+            
+            # Only one chunk is held in memory at a time
+            for df in chunks:
+                total += copy_chunk(cur, df, total + 1, datetime.now())
+                elapsed = time.perf_counter() - start
+                print(f"Copied {total} records ({total / elapsed:.0f} rows/s)")
+            
+            conn.commit()
+            print(f"Imported {total} records successfully")
+            return total
+            
+        except Exception as e:
+            print(f"Error in import_data_copy: {e}")
+            conn.rollback()
+            raise e
+
+def import_data_incremental(conn, df):
+    """Write only the new, changed and removed source rows.
+    
+    Loaded fingerprints are compared client side, the delta is staged with
+    COPY and merged in one transaction. Rows left by an import from before
+    the fingerprints existed are first matched to the source by name and
+    street address; other rows without a source_key, such as those added
+    through RestaurantUI.add_review, are never touched.
+    """
+    df = add_fingerprints(df).drop_duplicates('source_key', keep='last')
+    with conn.cursor() as cur:
+        try:
+            # Give unfingerprinted rows the source_key they would have been
+            # imported with, one row per key. content_hash stays NULL so the
+            # diff below rewrites them from the source once
+            cur.execute("""
+                UPDATE restaurants r
+                SET source_key = legacy.source_key
+                FROM (
+                    SELECT DISTINCT ON (k.source_key) k.id, k.source_key
+                    FROM (
+                        SELECT id, md5(coalesce(name, '') || chr(31) ||
+                                       coalesce(street_address, '')) AS source_key
+                        FROM restaurants
+                        WHERE source_key IS NULL
+                    ) k
+                    WHERE k.source_key = ANY(%s::text[])
+                      AND NOT EXISTS (
+                          SELECT 1 FROM restaurants t WHERE t.source_key = k.source_key
+                      )
+                    ORDER BY k.source_key, k.id
+                ) legacy
+                WHERE r.id = legacy.id AND r.source_key IS NULL;
+            """, (df['source_key'].tolist(),))
+            if cur.rowcount:
+                print(f"Matched {cur.rowcount} rows from an earlier import to the source")
+            
+            cur.execute("""
+                SELECT source_key, content_hash
+                FROM restaurants
+                WHERE source_key IS NOT NULL;
+            """)
+            loaded = dict(cur.fetchall())
+            
+            # New keys map to NaN, which never equals a hash
+            delta = df[df['content_hash'] != df['source_key'].map(loaded)]
+            removed = list(set(loaded) - set(df['source_key']))
+            
+            # Stage the new and changed rows
+            cur.execute("""
+                CREATE TEMP TABLE restaurants_staging
+                (LIKE restaurants INCLUDING DEFAULTS) ON COMMIT DROP;
+            """)
+            copy_chunk(cur, delta, 1, datetime.now(), table='restaurants_staging')
+            
+            # Changed rows keep their id and created_at
+            cur.execute("""
+                UPDATE restaurants r
+                SET name = s.name, street_address = s.street_address,
+                    location = s.location, type = s.type, rating = s.rating,
+                    review_count = s.review_count,
+                    contact_number = s.contact_number,
+                    trip_advisor_url = s.trip_advisor_url, menu = s.menu,
+                    price_range = s.price_range, city = s.city,
+                    content_hash = s.content_hash
+                FROM restaurants_staging s
+                WHERE r.source_key = s.source_key;
+            """)
+            updated = cur.rowcount
+            
+            # New rows draw ids from the sequence, in file order
+            cur.execute("""
+                INSERT INTO restaurants (
+                    id, name, street_address, location, type, rating,
+                    review_count, contact_number, trip_advisor_url,
+                    menu, price_range, city, source_key, content_hash,
+                    created_at
+                )
+                SELECT nextval('restaurants_id_seq'),
+                       s.name, s.street_address, s.location, s.type, s.rating,
+                       s.review_count, s.contact_number, s.trip_advisor_url,
+                       s.menu, s.price_range, s.city, s.source_key,
+                       s.content_hash, s.created_at
+                FROM (
+                    SELECT * FROM restaurants_staging s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM restaurants r WHERE r.source_key = s.source_key
+                    )
+                    ORDER BY s.id
+                ) s;
+            """)
+            inserted = cur.rowcount
+            
+            # Rows that disappeared from the source
+            cur.execute("""
+                DELETE FROM restaurants
+                WHERE source_key = ANY(%s::char(32)[]);
+            """, (removed,))
+            deleted = cur.rowcount
+            
+            conn.commit()
+            print(f"Incremental import: {inserted} new, {updated} changed, "
+                  f"{deleted} removed, {len(df) - len(delta)} unchanged")
+            return inserted + updated + deleted
+            
+        except Exception as e:
+            print(f"Error in import_data_incremental: {e}")
+            conn.rollback()
+            raise e
+
+def plan_partitions(csv_path, partitions):
+    """Split the CSV into byte ranges on line boundaries.
+    
+    Returns (offset, first_id, rows) per partition. Ids follow file order,
+    so the assignment matches the single process loaders.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        f.readline()  # skip the header
+        data_start = f.tell()
+        
+        # Cut at evenly spaced byte positions, moved forward to the next line start
+        bounds = [data_start]
+        for i in range(1, partitions):
+            f.seek(max(data_start, size * i // partitions))
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+        
+        # Count rows per range without parsing
+        plan = []
+        next_id = 1
+        for start, end in zip(bounds, bounds[1:]):
+            if start >= end:
+                continue
+            f.seek(start)
+            remaining = end - start
+            rows = 0
+            last = b''
+            while remaining:
+                block = f.read(min(remaining, 1 << 20))
+                rows += block.count(b'\n')
+                remaining -= len(block)
+                last = block[-1:]
+            if last != b'\n':
+                rows += 1  # final line without a trailing newline
+            plan.append((start, next_id, rows))
+            next_id += rows
+    return plan
+
+def load_partition(db_params, csv_path, names, offset, first_id, rows, chunk_size):
+    """Worker: read, clean and COPY one partition over its own connection"""
+    conn = psycopg2.connect(**db_params)
+    try:
+        with open(csv_path, 'rb') as f, conn.cursor() as cur:
+            f.seek(offset)
+            reader = read_dataset(f, header=None, names=names,
+                                  nrows=rows, chunksize=chunk_size)
+            next_id = first_id
+            for chunk in reader:
+                next_id += copy_chunk(cur, clean_data_fast(chunk), next_id, datetime.now())
+        conn.commit()
+        return next_id - first_id
+    finally:
+        conn.close()
+
+def import_data_parallel(db_params, csv_path, workers, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Load the CSV with one worker process and connection per partition.
+    
+    Each partition commits on its own, so a failed worker leaves the other
+    partitions loaded; the error is re-raised once all workers finish.
+    """
+    names = pd.read_csv(csv_path, sep=';', nrows=0).columns.tolist()
+    plan = plan_partitions(csv_path, workers)
+    print(f"Split {csv_path} into {len(plan)} partitions")
+    
+    total = 0
+    errors = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(load_partition, db_params, csv_path, names,
+                        offset, first_id, rows, chunk_size): first_id
+            for offset, first_id, rows in plan
+        }
+        for future in as_completed(futures):
+            try:
+                total += future.result()
+            except Exception as e:
+                print(f"Error in partition starting at id {futures[future]}: {e}")
+                errors.append(e)
+                continue
+            elapsed = time.perf_counter() - start
+            print(f"Copied {total} records ({total / elapsed:.0f} rows/s)")
+    
+    if errors:
+        raise errors[0]
+    print(f"Imported {total} records successfully")
+    return total
+
+def parse_args(argv=None):
+    """Parse command line options for the importer"""
+    parser = argparse.ArgumentParser(description="Import restaurant reviews into TimescaleDB")
+    parser.add_argument('--csv', default='dataset/reviews_data.csv',
+                        help="path to the semicolon separated source file")
+    parser.add_argument('--method', choices=['values', 'copy', 'parallel', 'incremental'],
+                        default='values',
+                        help="values: execute_values over the whole frame, "
+                             "copy: stream chunks with COPY FROM STDIN, "
+                             "parallel: COPY partitions from a process pool, "
+                             "incremental: merge only changed rows into the existing table")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows per chunk for the copy and parallel methods")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always re-parse and re-clean the CSV")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="record per-phase timings and write them to PATH "
+                             "(Prometheus text for .prom, JSON otherwise)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="worker processes for the parallel method")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    
     # Database connection parameters
     db_params = {
         'dbname': 'restaurant_db',
@@ -136,29 +640,50 @@ def main():
     }
     
     try:
-        # Read the CSV file
-        df = pd.read_csv('dataset/reviews_data.csv', sep=';')
-        print("CSV file read successfully")
-        
-        # Clean the data
-        df_cleaned = clean_data(df)
-        print("Data cleaned successfully")
-        
         # Connect to the database
         conn = psycopg2.connect(**db_params)
         print("Connected to database successfully")
         
-        # Create the table
-        create_table(conn)
+        # Create the table, keeping existing rows for incremental refreshes
+        with metrics.timer('import', phase='create'):
+            create_table(conn, drop=args.method != 'incremental')
+        
+        start = time.perf_counter()
+        if args.method in ('incremental', 'values'):
+            # Read and clean the CSV file, or reuse the cached result
+            df_cleaned = load_dataset(args.csv, use_cache=not args.no_cache)
+        
+        # The streaming methods read and clean inside the load phase
+        with metrics.timer('import', phase='load', method=args.method) as timer:
+            if args.method == 'incremental':
+                timer.rows = import_data_incremental(conn, df_cleaned)
+            elif args.method == 'parallel':
+                # Workers open their own connections
+                timer.rows = import_data_parallel(db_params, args.csv, args.workers, args.chunk_size)
+            elif args.method == 'copy':
+                # Read, clean and load chunk by chunk
+                timer.rows = import_data_copy(conn, iter_clean_chunks(args.csv, args.chunk_size))
+            else:
+                # Import the data
+                timer.rows = import_data(conn, df_cleaned)
+        print(f"Load finished in {time.perf_counter() - start:.2f}s using '{args.method}'")
         
-        # Import the data
-        import_data(conn, df_cleaned)
+        # Continue ids after rows the bulk loaders numbered themselves; the
+        # incremental import draws its ids from the sequence already
+        with metrics.timer('import', phase='rank'):
+            if args.method != 'incremental':
+                sync_id_sequence(conn)
+            # Rebuild the per-city rankings
+            refresh_top_n(conn)
         
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
+        if args.metrics:
+            metrics.write(args.metrics)
+            print(f"Metrics written to {args.metrics}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import glob
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+def file_hash(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_file(cache_dir, source_path, digest, version):
+    """Path of the cache entry for one source file, content hash and cleaning version"""
+    base = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, f"{base}-{digest[:16]}-v{version}.feather")
+
+def load(cache_dir, source_path, digest, version):
+    """Return the cached frame, or None when there is no valid entry"""
+    if feather is None:
+        return None
+    path = cache_file(cache_dir, source_path, digest, version)
+    if not os.path.exists(path):
+        return None
+    # Uncompressed Feather files are mapped rather than read into memory,
+    # strings stay Arrow-backed as they were when read_dataset parsed them
+    table = feather.read_table(path, memory_map=True)
+    arrow_string = pd.StringDtype('pyarrow')
+    return table.to_pandas(types_mapper={pa.string(): arrow_string,
+                                         pa.large_string(): arrow_string}.get)
+
+def store(cache_dir, source_path, digest, version, df):
+    """Write the frame as a cache entry and drop stale entries for the same source"""
+    if feather is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_file(cache_dir, source_path, digest, version)
+    
+    # Write to a temporary name first so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    
+    base = os.path.splitext(os.path.basename(source_path))[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{base}-*.feather")):
+        if stale != path:
+            os.remove(stale)
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from collections import deque
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+class Histogram:
+    """Cumulative-bucket latency histogram plus a row counter"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.rows = 0
+
+    def observe(self, seconds, rows=0):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+        self.rows += rows
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+class _Timer:
+    """Times one operation; set .rows inside the block to record a row count"""
+    __slots__ = ('metrics', 'key', 'start', 'elapsed', 'rows')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.key, self.elapsed, self.rows)
+        return False
+
+class _NullTimer:
+    """Stand-in returned while metrics are disabled"""
+    __slots__ = ('rows', 'elapsed')
+
+    def __init__(self):
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+class Metrics:
+    """Per-operation latency histograms, row counts and slow query plans.
+    
+    Disabled by default; timer() then returns a shared no-op object, so
+    instrumented code only pays for one attribute check and a call.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_threshold = None
+        self.slow_queries = deque(maxlen=100)
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._null_timer = _NullTimer()
+
+    def enable(self, slow_query_threshold=None):
+        """Start recording; plans are captured for queries slower than the threshold (seconds)"""
+        self.slow_query_threshold = slow_query_threshold
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.slow_queries.clear()
+
+    def timer(self, operation, **labels):
+        """Context manager timing one operation, e.g. timer('search', sort='rating')"""
+        if not self.enabled:
+            return self._null_timer
+        return _Timer(self, (operation, tuple(sorted(labels.items()))))
+
+    def observe(self, key, seconds, rows=0):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds, rows)
+
+    def capture_plan(self, cur, operation, statement, params, elapsed):
+        """Store EXPLAIN (ANALYZE, BUFFERS) of a read-only statement that ran too long.
+        
+        The statement is executed again by ANALYZE, so never pass writes.
+        """
+        if not self.enabled or self.slow_query_threshold is None or elapsed < self.slow_query_threshold:
+            return
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", params)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+        self.slow_queries.append({
+            'operation': operation,
+            'seconds': elapsed,
+            'statement': statement,
+            'params': [str(p) for p in params],
+            'plan': plan,
+            'captured_at': time.time(),
+        })
+
+    def to_json(self):
+        """Snapshot of all histograms and captured plans as a JSON string"""
+        with self._lock:
+            operations = [{
+                'operation': operation,
+                'labels': dict(labels),
+                'count': h.count,
+                'sum_seconds': h.sum,
+                'rows': h.rows,
+                'buckets': {('+Inf' if bound == float('inf') else str(bound)): count
+                            for bound, count in h.cumulative()},
+            } for (operation, labels), h in sorted(self._histograms.items())]
+            return json.dumps({'operations': operations,
+                               'slow_queries': list(self.slow_queries)}, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP restaurant_operation_seconds Latency of restaurant operations",
+            "# TYPE restaurant_operation_seconds histogram",
+        ]
+        rows = [
+            "# HELP restaurant_operation_rows_total Rows returned or written by operations",
+            "# TYPE restaurant_operation_rows_total counter",
+        ]
+        with self._lock:
+            for (operation, labels), h in sorted(self._histograms.items()):
+                label_text = ','.join(f'{k}="{v}"' for k, v in (('operation', operation),) + labels)
+                for bound, count in h.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'restaurant_operation_seconds_bucket{{{label_text},le="{le}"}} {count}')
+                lines.append(f'restaurant_operation_seconds_sum{{{label_text}}} {h.sum}')
+                lines.append(f'restaurant_operation_seconds_count{{{label_text}}} {h.count}')
+                rows.append(f'restaurant_operation_rows_total{{{label_text}}} {h.rows}')
+        return "\n".join(lines + rows) + "\n"
+
+    def write(self, path):
+        """Export to path, as Prometheus text for .prom files and JSON otherwise"""
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+# Process-wide registry used by data_import, restaurant_ui and the service
+metrics = Metrics()
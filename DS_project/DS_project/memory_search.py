@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from data_clean import load_dataset
+
+# Same ordinal as the price_rank column: unknown price ranges sort last
+PRICE_RANKS = {'$': 1, '$$ - $$$': 2, '$$$$': 3}
+UNKNOWN_PRICE_RANK = 4
+
+# Output columns, in the order get_restaurants returns them
+RESULT_COLUMNS = ['Name', 'Reviews', 'No of Reviews', 'Type', 'Price_Range',
+                  'Street Address', 'Location', 'Contact Number', 'Trip_advisor Url']
+
+def like_regex(pattern):
+    """Compile a LIKE pattern (% and _ wildcards) into a full-match regex"""
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.DOTALL)
+
+class InMemorySearch:
+    """get_restaurants-style queries over the cleaned dataset without a database.
+    
+    City, type and price range are stored as categorical codes, cuisines as
+    an inverted index from token to row numbers. Filters are evaluated once
+    per distinct value and mapped onto rows through the codes; results are
+    picked with argpartition on a precomputed rank per sort order.
+    """
+    def __init__(self, df):
+        n = len(df)
+        # Row ids follow file order, as the importers assign them
+        self.ids = np.arange(1, n + 1, dtype=np.int64)
+        self.rating = df['Reviews'].to_numpy(dtype=np.float64)
+        self.review_count = df['No of Reviews'].to_numpy(dtype=np.int64)
+        
+        city = pd.Categorical(df['City'].astype(object))
+        self.city_codes = city.codes.astype(np.int32)
+        self.city_keys = [str(c).lower() for c in city.categories]
+        
+        types = pd.Categorical(df['Type'].astype(object))
+        self.type_codes = types.codes.astype(np.int32)
+        self.type_keys = [str(t).lower() for t in types.categories]
+        
+        price = pd.Categorical(df['Price_Range'].astype(object))
+        self.price_codes = price.codes.astype(np.int32)
+        code_ranks = [PRICE_RANKS.get(p, UNKNOWN_PRICE_RANK) for p in price.categories]
+        self.price_rank = np.array(code_ranks + [UNKNOWN_PRICE_RANK], dtype=np.int8)[self.price_codes]
+        
+        # Result columns as object arrays, fetched by row number
+        self.columns = [df[col].astype(object).where(df[col].notna(), None).to_numpy()
+                        for col in RESULT_COLUMNS]
+        
+        # cuisine token -> sorted row numbers, built per distinct type string
+        rows_by_type = pd.Series(np.arange(n)).groupby(self.type_codes).indices
+        cuisine_rows = {}
+        for code, rows in rows_by_type.items():
+            if code < 0:
+                continue
+            for token in re.split(r'\s*,\s*', self.type_keys[code]):
+                cuisine_rows.setdefault(token, []).append(rows)
+        self.cuisines = {token: np.sort(np.concatenate(parts))
+                         for token, parts in cuisine_rows.items()}
+        
+        # Position of every row in each full sort order; id breaks ties,
+        # highest first, as in sort_orders.SORT_KEYS
+        neg_ids = -self.ids
+        # Filter lookup tables are reused across queries for the same pattern
+        self._city_lut = lru_cache(maxsize=1024)(
+            lambda pattern: self._matching_codes(self.city_keys, pattern))
+        self._type_lut = lru_cache(maxsize=1024)(
+            lambda pattern: self._matching_codes(self.type_keys, pattern))
+        
+        self.ranks = {}
+        for sort, keys in {
+            'rating': (neg_ids, -self.review_count, -self.rating),
+            'price_asc': (neg_ids, -self.rating, self.price_rank),
+            'price_desc': (neg_ids, -self.rating, -self.price_rank.astype(np.int16)),
+        }.items():
+            rank = np.empty(n, dtype=np.int64)
+            rank[np.lexsort(keys)] = np.arange(n)
+            self.ranks[sort] = rank
+
+    @classmethod
+    def from_csv(cls, csv_path='dataset/reviews_data.csv', use_cache=True):
+        """Build the engine from the source file via the cleaning pipeline"""
+        return cls(load_dataset(csv_path, use_cache=use_cache))
+
+    @staticmethod
+    def _matching_codes(keys, pattern):
+        """Lookup table over codes (shifted by one for missing) for a LIKE pattern"""
+        pattern = pattern.lower()
+        lut = np.zeros(len(keys) + 1, dtype=bool)
+        inner = pattern[1:-1]
+        if '%' in inner or '_' in inner:
+            regex = like_regex(pattern)
+            lut[1:] = [regex.fullmatch(key) is not None for key in keys]
+        else:
+            # Plain '%text%' is a substring test
+            lut[1:] = [inner in key for key in keys]
+        return lut
+
+    def matching_rows(self, city, food_type=None, exact_type=False):
+        """Row numbers matching the search filters, in file order"""
+        city_lut = self._city_lut(f"%{city}%")
+        if food_type and exact_type:
+            rows = self.cuisines.get(food_type.strip().lower(), np.empty(0, dtype=np.int64))
+            return rows[city_lut[self.city_codes[rows] + 1]]
+        mask = city_lut[self.city_codes + 1]
+        if food_type:
+            type_lut = self._type_lut(f"%{food_type}%")
+            mask &= type_lut[self.type_codes + 1]
+        return np.flatnonzero(mask)
+
+    def search(self, city, food_type=None, sort='rating', limit=10, exact_type=False):
+        """Same arguments and row layout as RestaurantUI.get_restaurants"""
+        rows = self.matching_rows(city, food_type, exact_type)
+        rank = self.ranks[sort][rows]
+        if len(rows) > limit:
+            top = np.argpartition(rank, limit)[:limit]
+            rows, rank = rows[top], rank[top]
+        rows = rows[np.argsort(rank)]
+        return [tuple(column[row] for column in self.columns) for row in rows]
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+from urllib.parse import urlsplit, parse_qs
+
+from instrumentation import metrics
+from restaurant_ui import RestaurantUI, SEARCH_COLUMNS, SORT_ORDERS
+
+# Keys of a search result row in JSON responses
+RESULT_FIELDS = [column.strip() for column in SEARCH_COLUMNS.split(',')]
+
+HTTP_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Content Too Large',
+                500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+# Largest request body read; a review record is a few hundred bytes
+MAX_BODY_BYTES = 1 << 20
+
+class BodyTooLarge(Exception):
+    pass
+
+def content_length(headers):
+    """Body size announced by the request, at most MAX_BODY_BYTES"""
+    value = headers.get('content-length', '0')
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(f"invalid Content-Length {value!r}")
+    if int(value) > MAX_BODY_BYTES:
+        raise BodyTooLarge(f"request body over {MAX_BODY_BYTES} bytes")
+    return int(value)
+
+class RestaurantService:
+    """Coroutine front for the search, add and delete operations.
+    
+    Calls run the pooled RestaurantUI query methods on worker threads, at
+    most max_concurrency at a time, each bounded by timeout seconds
+    including the wait for a free slot. A call that times out keeps its
+    slot until its thread finishes, since the thread still holds a pooled
+    connection. The same timeout is applied to the database as
+    statement_timeout, so that thread doesn't keep its query running.
+    """
+    def __init__(self, backend=None, max_concurrency=10, timeout=5.0):
+        if backend is None:
+            backend = RestaurantUI(max_connections=max_concurrency)
+            backend.db_params['options'] = f"-c statement_timeout={int(timeout * 1000)}"
+        self.backend = backend
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def _call(self, func, *args, **kwargs):
+        async with asyncio.timeout(self.timeout):
+            await self._slots.acquire()
+            # Threads can't be cancelled, so the slot is released when the
+            # thread is done rather than when the caller stops waiting
+            task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+            task.add_done_callback(self._finished)
+            return await asyncio.shield(task)
+
+    def _finished(self, task):
+        self._slots.release()
+        # Nobody awaits a call that timed out; don't warn about its error
+        if not task.cancelled():
+            task.exception()
+
+    async def search(self, city, food_type=None, sort='rating', page_size=10, token=None,
+                     exact_type=False):
+        """One page of results as dicts, plus the token for the next page"""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+        rows, next_token = await self._call(self.backend.search_page, city, food_type, sort,
+                                            page_size, token, exact_type)
+        return [dict(zip(RESULT_FIELDS, row)) for row in rows], next_token
+
+    async def add_review(self, record):
+        """Insert one review record, returning its id"""
+        ids = await self._call(self.backend.add_reviews, [record])
+        return ids[0]
+
+    async def delete_restaurant(self, name):
+        """Delete restaurants by name, returning how many rows were removed"""
+        return await self._call(self.backend.delete_restaurant, name)
+
+    def close(self):
+        self.backend.close_db()
+        self.backend.shortener.close()
+
+class HttpFrontend:
+    """Minimal HTTP/JSON server over a RestaurantService.
+    
+    GET    /restaurants?city=&type=&sort=&page_size=&token=&exact=
+    POST   /restaurants            JSON review record
+    DELETE /restaurants?name=
+    GET    /stats                  search cache counters
+    GET    /metrics                latency histograms, Prometheus text
+    GET    /metrics.json           histograms and slow query plans
+    """
+    def __init__(self, service):
+        self.service = service
+
+    async def route(self, method, path, query, body):
+        """Return (status, payload) for one request"""
+        if path == '/stats' and method == 'GET':
+            return 200, self.service.backend.search_cache.stats()
+        if path == '/metrics' and method == 'GET':
+            return 200, metrics.to_prometheus()
+        if path == '/metrics.json' and method == 'GET':
+            return 200, json.loads(metrics.to_json())
+        if path != '/restaurants':
+            return 404, {'error': 'not found'}
+        
+        if method == 'GET':
+            city = query.get('city')
+            if not city:
+                raise ValueError("city is required")
+            restaurants, next_token = await self.service.search(
+                city, query.get('type') or None, query.get('sort', 'rating'),
+                int(query.get('page_size', 10)), query.get('token'),
+                query.get('exact') in ('1', 'true'))
+            return 200, {'restaurants': restaurants, 'next_token': next_token}
+        if method == 'POST':
+            record = json.loads(body or b'{}')
+            return 201, {'id': await self.service.add_review(record)}
+        if method == 'DELETE':
+            name = query.get('name')
+            if not name:
+                raise ValueError("name is required")
+            return 200, {'deleted': await self.service.delete_restaurant(name)}
+        return 405, {'error': 'method not allowed'}
+
+    async def handle(self, reader, writer):
+        """Serve one request per connection"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            
+            try:
+                body = await reader.readexactly(content_length(headers))
+                method, target = request_line[0], request_line[1]
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, payload = await self.route(method.upper(), url.path, query, body)
+            except asyncio.IncompleteReadError:
+                raise
+            except BodyTooLarge as e:
+                status, payload = 413, {'error': str(e)}
+            except (ValueError, KeyError, IndexError) as e:
+                status, payload = 400, {'error': str(e)}
+            except asyncio.TimeoutError:
+                status, payload = 504, {'error': 'request timed out'}
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+            
+            if isinstance(payload, str):
+                data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+            else:
+                data, content_type = json.dumps(payload, default=str).encode('utf-8'), 'application/json'
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host='127.0.0.1', port=8080, max_concurrency=10, timeout=5.0):
+    """Run the HTTP front end until cancelled"""
+    service = RestaurantService(max_concurrency=max_concurrency, timeout=timeout)
+    frontend = HttpFrontend(service)
+    server = await asyncio.start_server(frontend.handle, host, port)
+    print(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve restaurant searches over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-concurrency', type=int, default=10,
+                        help="requests run against the database at once")
+    parser.add_argument('--timeout', type=float, default=5.0,
+                        help="seconds allowed per request")
+    parser.add_argument('--metrics', action='store_true',
+                        help="record latency histograms, served at /metrics")
+    parser.add_argument('--slow-query-ms', type=float,
+                        help="with --metrics, capture EXPLAIN (ANALYZE, BUFFERS) for "
+                             "searches slower than this")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable(args.slow_query_ms / 1000 if args.slow_query_ms else None)
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrency, args.timeout))
+    except KeyboardInterrupt:
+        print("\nGoodbye!")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,127 @@
-import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from tabulate import tabulate
 from datetime import datetime
+from contextlib import contextmanager
+import threading
+import base64
+import json
+import uuid
 import re
-from pyshorteners import Shortener
+from instrumentation import metrics
+from search_cache import SearchCache
+from sort_orders import SORT_KEYS, SORT_ORDERS, TOP_N
+from url_shortener import UrlShortener
+
+# Accepted price ranges: '$' to '$$$$', or '$$ - $$$' with or without spaces
+PRICE_RANGE_PATTERN = r'\${1,4}$|\$\$ ?- ?\$\$\$$'
+
+def normalize_price_range(price_range):
+    """Spell an accepted range as '$$ - $$$', the form price_rank ranks"""
+    return re.sub(r' ?- ?', ' - ', price_range)
+
+# Fields of a review record for add_reviews, in restaurants column order
+REVIEW_FIELDS = [
+    'name', 'street_address', 'location', 'type', 'rating', 'review_count',
+    'contact_number', 'trip_advisor_url', 'menu', 'price_range', 'city'
+]
+REQUIRED_REVIEW_FIELDS = [
+    'name', 'street_address', 'location', 'type', 'contact_number',
+    'price_range', 'city'
+]
+
+def numbered(sql):
+    """Turn %s placeholders into $1, $2, ... for PREPARE"""
+    parts = sql.split('%s')
+    return parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+
+def search_filter(city, food_type, exact_type):
+    """WHERE conditions for a search as (name, sql, types, params).
+    
+    city_key and type_key are lower(city) and lower(type) with trigram
+    indexes, so these match what ILIKE '%...%' did without a scan.
+    """
+    if food_type and exact_type:
+        return ('cuisine', "city_key LIKE lower(%s) AND cuisines @> ARRAY[lower(%s)]",
+                ['text', 'text'], [f"%{city}%", food_type.strip()])
+    if food_type:
+        return ('type', "city_key LIKE lower(%s) AND type_key LIKE lower(%s)",
+                ['text', 'text'], [f"%{city}%", f"%{food_type}%"])
+    return ('city', "city_key LIKE lower(%s)", ['text'], [f"%{city}%"])
+
+def keyset_condition(keys):
+    """Condition selecting rows that sort after a key row, with one %s per key.
+    
+    The leading column gets an inclusive bound of its own so the scan can
+    start at the right place in the matching index.
+    """
+    alternatives = []
+    for i, (column, direction, _) in enumerate(keys):
+        op = '<' if direction == 'DESC' else '>'
+        equal = [f"{c} = %s" for c, _, _ in keys[:i]]
+        alternatives.append("(" + " AND ".join(equal + [f"{column} {op} %s"]) + ")")
+    leading, direction, _ = keys[0]
+    bound = f"{leading} {'<=' if direction == 'DESC' else '>='} %s"
+    return f"{bound} AND ({' OR '.join(alternatives)})"
+
+def keyset_params(values):
+    """Parameters for keyset_condition, in placeholder order"""
+    params = [values[0]]
+    for i in range(len(values)):
+        params.extend(values[:i + 1])
+    return params
+
+def encode_token(sort, city, food_type, exact_type, values):
+    """Opaque continuation token for the page after the row holding values"""
+    payload = json.dumps([sort, city, food_type, exact_type, list(values)])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_token(token, sort, city, food_type, exact_type):
+    """Key values from a token, which must belong to the same search"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        token_sort, token_city, token_type, token_exact, values = payload
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid page token") from e
+    if [token_sort, token_city, token_type, token_exact] != [sort, city, food_type, exact_type]:
+        raise ValueError("Page token belongs to a different search")
+    return values
+
+def validate_review(record):
+    """Check a review record with the rules add_review applies to typed input.
+    
+    Returns the field values in REVIEW_FIELDS order, raises ValueError.
+    """
+    values = {}
+    for field in REQUIRED_REVIEW_FIELDS:
+        value = str(record.get(field) or '').strip()
+        if not value:
+            raise ValueError(f"{field} cannot be empty")
+        values[field] = value
+    for field in ('trip_advisor_url', 'menu'):
+        values[field] = str(record.get(field) or '').strip()
+    
+    rating = float(record.get('rating'))
+    if not 0 <= rating <= 5:
+        raise ValueError("rating must be between 0 and 5")
+    values['rating'] = rating
+    
+    review_count = int(record.get('review_count'))
+    if review_count < 0:
+        raise ValueError("review_count must be positive")
+    values['review_count'] = review_count
+    
+    if not re.match(PRICE_RANGE_PATTERN, values['price_range']):
+        raise ValueError(f"invalid price range {values['price_range']!r}")
+    values['price_range'] = normalize_price_range(values['price_range'])
+    return tuple(values[field] for field in REVIEW_FIELDS)
+
+SEARCH_COLUMNS = """name, rating, review_count, type, price_range, 
+                      street_address, location, contact_number, trip_advisor_url"""
 
 class RestaurantUI:
-    def __init__(self):
+    def __init__(self, min_connections=None, max_connections=10, cache_size=1024, cache_ttl=300,
+                 shortener=None):
         self.db_params = {
             'dbname': 'restaurant_db',
             'user': 'jh',
@@ -13,18 +129,66 @@ class RestaurantUI:
             'host': 'localhost',
             'port': '5432'
         }
-        self.conn = None
-        self.shortener = Shortener()
+        # The pool closes returned connections beyond min_connections, and
+        # with them their prepared statements, so by default it keeps all
+        self.min_connections = max_connections if min_connections is None else min_connections
+        self.max_connections = max_connections
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        # Callers block here instead of getting PoolError when the pool is exhausted
+        self._pool_slots = threading.BoundedSemaphore(max_connections)
+        # Names of the statements already prepared on each pooled connection
+        self._prepared = {}
+        self.search_cache = SearchCache(cache_size, cache_ttl)
+        self.shortener = shortener if shortener is not None else UrlShortener()
 
     def connect_db(self):
-        """Establish database connection"""
-        if not self.conn:
-            self.conn = psycopg2.connect(**self.db_params)
+        """Create the connection pool"""
+        with self._pool_lock:
+            if not self.pool:
+                self.pool = ThreadedConnectionPool(
+                    self.min_connections, self.max_connections, **self.db_params)
 
     def close_db(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Close all pooled connections"""
+        with self._pool_lock:
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
+                self._prepared.clear()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, waiting while all of them are in use"""
+        self.connect_db()
+        with self._pool_slots:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+            finally:
+                # Never hand a connection back with an open transaction
+                if not conn.closed:
+                    conn.rollback()
+                self.pool.putconn(conn, close=bool(conn.closed))
+                # putconn may have closed it to stay within min_connections
+                if conn.closed:
+                    self._prepared.pop(conn, None)
+
+    def execute_prepared(self, conn, cur, name, param_types, sql, params):
+        """Run sql as a server-side prepared statement, preparing it once per connection.
+        
+        Returns the EXECUTE statement, which takes params as its arguments.
+        """
+        prepared = self._prepared.setdefault(conn, set())
+        if name not in prepared:
+            cur.execute(f"PREPARE {name} ({', '.join(param_types)}) AS {sql}")
+            prepared.add(name)
+        if params:
+            statement = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+        else:
+            statement = f"EXECUTE {name}"
+        cur.execute(statement, params)
+        return statement
 
     def get_sort_order(self):
         """Get user's preferred sort order"""
@@ -37,60 +201,148 @@ class RestaurantUI:
             choice = input("Enter your choice (1-3): ").strip()
             
             if choice == '1':
-                return "ORDER BY rating DESC, review_count DESC"
+                return 'rating'
             
             elif choice == '2':
-                # Sorting price range from '$' -> lowest to '$$$$' -> highest
-                return """
-                    ORDER BY 
-                    CASE price_range 
-                        WHEN '$' THEN 1 
-                        WHEN '$$ - $$$' THEN 2 
-                        WHEN '$$$$' THEN 3 
-                        ELSE 4 -- Handle unexpected values
-                    END, rating DESC
-                """
+                return 'price_asc'
             
             elif choice == '3':
-                # Sorting price range from '$$$$' -> highest to '$' -> lowest
-                return """
-                    ORDER BY 
-                    CASE price_range 
-                        WHEN '$' THEN 1 
-                        WHEN '$$ - $$$' THEN 2 
-                        WHEN '$$$$' THEN 3 
-                        ELSE 4 -- Handle unexpected values
-                    END DESC, rating DESC
-                """
+                return 'price_desc'
             
             else:
                 print("Invalid choice. Please try again.")
 
 
-    def get_restaurants(self, city, food_type=None, sort_order="ORDER BY rating DESC", limit=10):
-        """Get restaurants based on city and optional food type"""
-        with self.conn.cursor() as cur:
-            if food_type:
-                query = f"""
-                    SELECT name, rating, review_count, type, price_range, 
-                           street_address, location, contact_number, trip_advisor_url
-                    FROM restaurants
-                    WHERE city ILIKE %s AND type ILIKE %s
-                    {sort_order}
-                    LIMIT %s;
-                """
-                cur.execute(query, (f"%{city}%", f"%{food_type}%", limit))
-            else:
-                query = f"""
-                    SELECT name, rating, review_count, type, price_range, 
-                           street_address, location, contact_number, trip_advisor_url
+    def get_restaurants(self, city, food_type=None, sort='rating', limit=10, exact_type=False):
+        """Get restaurants based on city and optional food type
+        
+        food_type matches anywhere in the type text, as ILIKE did; with
+        exact_type=True it must name one of the restaurant's cuisines.
+        """
+        key_count = len(SORT_KEYS[sort])
+        return [row[:-key_count] for row in self._first_rows(city, food_type, sort, limit, exact_type)]
+
+    def _first_rows(self, city, food_type, sort, limit, exact_type):
+        """First rows of a search with their sort key values, through the cache"""
+        key = SearchCache.make_key(city, food_type, sort, limit) + (exact_type,)
+        rows, generation = self.search_cache.get(key)
+        if rows is None:
+            rows = self._query_restaurants(city, food_type, sort, limit, exact_type)
+            self.search_cache.put(key, rows, generation)
+        return rows
+
+    def _query_restaurants(self, city, food_type, sort, limit, exact_type=False):
+        """Run the search against the database, bypassing the cache.
+        
+        Rows end with the sort key columns, which search_page turns into
+        its continuation token.
+        """
+        sort_order = SORT_ORDERS[sort]
+        key_columns = ', '.join(column for column, _, _ in SORT_KEYS[sort])
+        with self.connection() as conn, conn.cursor() as cur:
+            with metrics.timer('search', sort=sort) as timer:
+                if not food_type and limit <= TOP_N:
+                    # The precomputed per-city rankings hold every candidate row
+                    query = f"""
+                        SELECT {SEARCH_COLUMNS}, {key_columns}
+                        FROM restaurant_top_n
+                        WHERE sort_key = $1 AND city_key LIKE lower($2)
+                        {sort_order}
+                        LIMIT $3
+                    """
+                    params = [sort, f"%{city}%", limit]
+                    statement = self.execute_prepared(conn, cur, f"search_{sort}_top_n",
+                                                      ['text', 'text', 'int'], query, params)
+                else:
+                    name, where, types, params = search_filter(city, food_type, exact_type)
+                    query = numbered(f"""
+                        SELECT {SEARCH_COLUMNS}, {key_columns}
+                        FROM restaurants
+                        WHERE {where}
+                        {sort_order}
+                        LIMIT %s
+                    """)
+                    params = params + [limit]
+                    statement = self.execute_prepared(conn, cur, f"search_{sort}_{name}",
+                                                      types + ['int'], query, params)
+                rows = cur.fetchall()
+                timer.rows = len(rows)
+            metrics.capture_plan(cur, 'search', statement, params, timer.elapsed)
+            return rows
+
+    def search_page(self, city, food_type=None, sort='rating', page_size=10, token=None,
+                    exact_type=False):
+        """Get one page of a search and the token for the next page.
+        
+        The first page is a cached get_restaurants-style search, served from
+        restaurant_top_n when it fits. Later pages are found by seeking past
+        the last row of the previous page rather than with OFFSET, so a deep
+        page costs the same as the first. next_token is None on the last page.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        keys = SORT_KEYS[sort]
+        
+        # One extra row tells whether another page exists
+        if token is None:
+            rows = self._first_rows(city, food_type, sort, page_size + 1, exact_type)
+        else:
+            rows = self._next_rows(city, food_type, sort, page_size + 1, token, exact_type)
+        
+        next_token = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_token = encode_token(sort, city, food_type, exact_type, rows[-1][-len(keys):])
+        return [row[:-len(keys)] for row in rows], next_token
+
+    def _next_rows(self, city, food_type, sort, limit, token, exact_type):
+        """Rows after the one a page token points at, with their sort key values"""
+        keys = SORT_KEYS[sort]
+        values = decode_token(token, sort, city, food_type, exact_type)
+        key_columns = ', '.join(column for column, _, _ in keys)
+        name, where, types, params = search_filter(city, food_type, exact_type)
+        where = f"{where} AND {keyset_condition(keys)}"
+        types = types + [keys[0][2]] + [t for i in range(len(keys)) for _, _, t in keys[:i + 1]]
+        params = params + keyset_params(values) + [limit]
+        query = numbered(f"""
+            SELECT {SEARCH_COLUMNS}, {key_columns}
+            FROM restaurants
+            WHERE {where}
+            {SORT_ORDERS[sort]}
+            LIMIT %s
+        """)
+        with self.connection() as conn, conn.cursor() as cur:
+            with metrics.timer('search_page', sort=sort) as timer:
+                statement = self.execute_prepared(conn, cur, f"page_{sort}_{name}_after",
+                                                  types + ['int'], query, params)
+                rows = cur.fetchall()
+                timer.rows = len(rows)
+            metrics.capture_plan(cur, 'search_page', statement, params, timer.elapsed)
+        return rows
+
+    def stream_restaurants(self, city, food_type=None, sort='rating', batch_size=500,
+                           exact_type=False):
+        """Yield every matching row in lists of up to batch_size rows.
+        
+        Rows come from a named server-side cursor, so only one batch is in
+        memory at a time. The pooled connection is held until the generator
+        is exhausted or closed.
+        """
+        _, where, _, params = search_filter(city, food_type, exact_type)
+        with self.connection() as conn:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = batch_size
+                cur.execute(f"""
+                    SELECT {SEARCH_COLUMNS}
                     FROM restaurants
-                    WHERE city ILIKE %s
-                    {sort_order}
-                    LIMIT %s;
-                """
-                cur.execute(query, (f"%{city}%", limit))
-            return cur.fetchall()
+                    WHERE {where}
+                    {SORT_ORDERS[sort]}
+                """, params)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
 
     def validate_required_input(self, prompt, field_name):
         """Get and validate required input"""
@@ -141,76 +393,140 @@ class RestaurantUI:
         # Get price range
         while True:
             price_range = self.validate_required_input("Price Range ($, $$ - $$$, $$$, or $$$$): ", "Price range")
-            if re.match(r'\${1,4}$|\$\$-\$\$\$', price_range):
+            if re.match(PRICE_RANGE_PATTERN, price_range):
+                price_range = normalize_price_range(price_range)
                 break
             print("Please enter a valid price range ($, $$ - $$$, $$$, or $$$$)")
 
         try:
-            with self.conn.cursor() as cur:
-                # Get the next available ID
-                cur.execute("SELECT MAX(id) FROM restaurants")
-                max_id = cur.fetchone()[0] or 0
-                new_id = max_id + 1
-
-                # Insert new restaurant
-                cur.execute("""
-                    INSERT INTO restaurants (
-                        id, name, street_address, location, type, rating, 
-                        review_count, contact_number, trip_advisor_url,
-                        menu, price_range, city, created_at
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    new_id, name, street, location, restaurant_type, rating,
-                    review_count, contact, url, menu, price_range, city,
-                    datetime.now()
-                ))
-                self.conn.commit()
-                print("\nRestaurant review added successfully!")
+            self.insert_restaurant(name, street, location, restaurant_type, rating,
+                                   review_count, contact, url, menu, price_range, city)
+            print("\nRestaurant review added successfully!")
                 
         except Exception as e:
             print(f"Error adding review: {e}")
-            self.conn.rollback()
+
+    def insert_restaurant(self, name, street, location, restaurant_type, rating,
+                          review_count, contact, url, menu, price_range, city):
+        """Insert one restaurant without prompting, returning its new id"""
+        with self.connection() as conn, conn.cursor() as cur, metrics.timer('add') as timer:
+            timer.rows = 1
+            # The id comes from restaurants_id_seq
+            self.execute_prepared(conn, cur, "insert_restaurant", [
+                'text', 'text', 'text', 'text', 'float8', 'int', 'text',
+                'text', 'text', 'text', 'text', 'timestamptz'
+            ], """
+                INSERT INTO restaurants (
+                    id, name, street_address, location, type, rating, 
+                    review_count, contact_number, trip_advisor_url,
+                    menu, price_range, city, created_at
+                ) VALUES (
+                    nextval('restaurants_id_seq'),
+                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12
+                )
+                RETURNING id
+            """, (
+                name, street, location, restaurant_type, rating,
+                review_count, contact, url, menu, price_range, city,
+                datetime.now()
+            ))
+            new_id = cur.fetchone()[0]
+            cur.execute("SELECT refresh_restaurant_top_n(ARRAY[lower(%s)]);", (city,))
+            conn.commit()
+        self.search_cache.invalidate_city(city)
+        return new_id
+
+    def reserve_ids(self, cur, count):
+        """Draw a block of count ids from restaurants_id_seq in one round trip"""
+        cur.execute("SELECT nextval('restaurants_id_seq') FROM generate_series(1, %s)", (count,))
+        return [row[0] for row in cur.fetchall()]
+
+    def add_reviews(self, records, batch_size=1000):
+        """Insert review records without prompting, one transaction per batch.
+        
+        records is any iterable of dicts keyed by REVIEW_FIELDS. Records are
+        validated before their batch is written; the first invalid one stops
+        the ingest with ValueError, leaving earlier batches committed and its
+        own batch unwritten. Returns the new ids.
+        """
+        new_ids = []
+        batch = []
+        for index, record in enumerate(records):
+            try:
+                batch.append(validate_review(record))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"record {index}: {e}") from e
+            if len(batch) >= batch_size:
+                new_ids.extend(self._insert_batch(batch))
+                batch = []
+        if batch:
+            new_ids.extend(self._insert_batch(batch))
+        return new_ids
+
+    def _insert_batch(self, rows):
+        """Insert validated rows with ids reserved as one block"""
+        cities = {row[REVIEW_FIELDS.index('city')] for row in rows}
+        with self.connection() as conn, conn.cursor() as cur, metrics.timer('add_batch') as timer:
+            timer.rows = len(rows)
+            ids = self.reserve_ids(cur, len(rows))
+            now = datetime.now()
+            execute_values(cur, """
+                INSERT INTO restaurants (
+                    id, name, street_address, location, type, rating,
+                    review_count, contact_number, trip_advisor_url,
+                    menu, price_range, city, created_at
+                ) VALUES %s
+            """, [(new_id, *row, now) for new_id, row in zip(ids, rows)],
+                page_size=len(rows))
+            cur.execute("SELECT refresh_restaurant_top_n(ARRAY(SELECT lower(unnest(%s::text[]))));",
+                        (list(cities),))
+            conn.commit()
+        for city in cities:
+            self.search_cache.invalidate_city(city)
+        return ids
 
     def shorten_url(self, url):
-        """Shorten URL using pyshorteners"""
-        if not url or url.lower() == 'check the website for a menu':
-            return 'N/A'
-        try:
-            return self.shortener.tinyurl.short(url)
-        except:
-            return url
+        """Shorten URL using the cached shortener"""
+        return self.shortener.shorten_many([url])[0]
 
-    def display_restaurants(self, restaurants):
+    def display_restaurants(self, restaurants, title=None):
         """Display restaurant results in a formatted table"""
         if not restaurants:
             print("\nNo restaurants found")
             return
             
-        # Process the results to include shortened URLs
-        formatted_results = []
-        for restaurant in restaurants:
-            row_list = list(restaurant)
-            # Shorten the URL (last element in the row)
-            row_list[-1] = self.shorten_url(row_list[-1])
-            formatted_results.append(row_list)
+        # Shorten every URL (last element in the row) in one batch
+        short_urls = self.shortener.shorten_many([restaurant[-1] for restaurant in restaurants])
+        formatted_results = [
+            list(restaurant[:-1]) + [short_url]
+            for restaurant, short_url in zip(restaurants, short_urls)
+        ]
             
         headers = ['Name', 'Rating', 'Reviews', 'Type', 'Price', 'Address', 'Location', 'Phone', 'URL']
-        print(f"\nTop 10 Restaurants:")
+        print(f"\n{title or f'Top {len(restaurants)} Restaurants'}:")
         print(tabulate(formatted_results, headers=headers, tablefmt='grid'))
 
     def delete_restaurant(self, name):
-        """Delete a restaurant by its name"""
+        """Delete a restaurant by its name, returning the number of rows removed"""
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("DELETE FROM restaurants WHERE name = %s", (name,))
-                if cur.rowcount > 0:
-                    self.conn.commit()
+            with self.connection() as conn, conn.cursor() as cur, metrics.timer('delete') as timer:
+                self.execute_prepared(conn, cur, "delete_restaurant", ['text'],
+                                      "DELETE FROM restaurants WHERE name = $1 RETURNING city_key",
+                                      (name,))
+                cities = {row[0] for row in cur.fetchall()}
+                deleted = timer.rows = cur.rowcount
+                if deleted > 0:
+                    cur.execute("SELECT refresh_restaurant_top_n(%s);", (list(cities),))
+                    conn.commit()
+                    for city in cities:
+                        self.search_cache.invalidate_city(city)
                     print(f"\nRestaurant '{name}' has been successfully deleted.")
                 else:
                     print(f"\nNo restaurant found with the name '{name}'.")
+                return deleted
         except Exception as e:
             print(f"Error deleting restaurant: {e}")
-            self.conn.rollback()
+            raise e
 
     def run(self):
         """Main UI loop"""
@@ -235,8 +551,15 @@ class RestaurantUI:
                         food_type = self.validate_required_input("Enter food type (e.g., Italian, Seafood): ", "Food type")
                     
                     sort_order = self.get_sort_order()
-                    restaurants = self.get_restaurants(city, food_type, sort_order)
+                    restaurants, token = self.search_page(city, food_type, sort_order)
                     self.display_restaurants(restaurants)
+                    
+                    # Page through the rest of the results on request
+                    page = 1
+                    while token and input("\nShow more results? (y/n): ").strip().lower() == 'y':
+                        page += 1
+                        restaurants, token = self.search_page(city, food_type, sort_order, token=token)
+                        self.display_restaurants(restaurants, f"Restaurants (page {page})")
                 
                 elif choice == '2':
                     self.add_review()
@@ -252,6 +575,7 @@ class RestaurantUI:
             print(f"An error occurred: {e}")
         finally:
             self.close_db()
+            self.shortener.close()
 
 if __name__ == "__main__":
     ui = RestaurantUI()
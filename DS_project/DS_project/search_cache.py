@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+class SearchCache:
+    """In-process LRU cache with a TTL for get_restaurants results.
+    
+    Entries are keyed on the normalized search and dropped when a write
+    touches a city that the cached search pattern matches.
+    """
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, rows)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so in-flight lookups can't store stale rows
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(city, food_type, sort, limit):
+        """Normalize a search; ILIKE ignores case, so neither does the key"""
+        return (city.lower(), (food_type or '').lower(), sort, limit)
+
+    def get(self, key):
+        """Return (rows, generation); rows is None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], self._generation
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, key, rows, generation):
+        """Store rows fetched after get() returned generation"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_city(self, city):
+        """Drop every cached search whose city pattern matches city"""
+        city = (city or '').lower()
+        with self._lock:
+            self._generation += 1
+            # Patterns holding LIKE wildcards are dropped conservatively
+            stale = [key for key in self._entries
+                     if key[0] in city or '%' in key[0] or '_' in key[0]]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
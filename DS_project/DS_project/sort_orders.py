@@ -0,0 +1,26 @@
+# Sort orders offered by RestaurantUI. data_import builds restaurant_top_n
+# from the same definitions, so the rankings and the searches can't drift.
+# price_rank is stored by the importer: '$' -> 1, '$$ - $$$' -> 2,
+# '$$$$' -> 3, anything else -> 4
+
+# Rows per city and sort order kept in restaurant_top_n
+TOP_N = 50
+
+# Columns of each sort order as (column, direction, SQL type). id is the
+# final tiebreaker, so every order is total and keyset pages can seek on it
+SORT_KEYS = {
+    'rating': [('rating', 'DESC', 'float8'), ('review_count', 'DESC', 'int'),
+               ('id', 'DESC', 'int')],
+    # Sorting price range from '$' -> lowest to '$$$$' -> highest
+    'price_asc': [('price_rank', 'ASC', 'smallint'), ('rating', 'DESC', 'float8'),
+                  ('id', 'DESC', 'int')],
+    # Sorting price range from '$$$$' -> highest to '$' -> lowest
+    'price_desc': [('price_rank', 'DESC', 'smallint'), ('rating', 'DESC', 'float8'),
+                   ('id', 'DESC', 'int')],
+}
+
+# ORDER BY clauses for the sort choices offered by get_sort_order
+SORT_ORDERS = {
+    sort: "ORDER BY " + ", ".join(f"{column} {direction}" for column, direction, _ in keys)
+    for sort, keys in SORT_KEYS.items()
+}
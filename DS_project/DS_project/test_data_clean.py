@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from data_clean import CSV_COLUMNS, clean_data, clean_data_fast, read_dataset
+
+CSV_PATH = 'dataset/reviews_data.csv'
+
+def as_objects(s):
+    """Column values as Python objects with missing values as None"""
+    return s.astype(object).where(s.notna(), None).tolist()
+
+@pytest.fixture(scope='module')
+def cleaned():
+    # Object columns, as clean_data was written for
+    reference = clean_data(pd.read_csv(CSV_PATH, sep=';', dtype=object))
+    return reference, clean_data_fast(read_dataset(CSV_PATH))
+
+def test_same_shape(cleaned):
+    reference, fast = cleaned
+    assert list(fast.columns) == list(reference.columns) == CSV_COLUMNS
+    assert len(fast) == len(reference)
+
+@pytest.mark.parametrize('column', CSV_COLUMNS)
+def test_same_values(cleaned, column):
+    reference, fast = cleaned
+    assert as_objects(fast[column]) == as_objects(reference[column])
+
+def test_numeric_dtypes(cleaned):
+    _, fast = cleaned
+    assert fast['No of Reviews'].dtype == 'int64'
+    assert fast['Reviews'].dtype == 'float64'
+
+def test_input_not_modified():
+    df = read_dataset(CSV_PATH)
+    before = df.copy()
+    clean_data_fast(df)
+    pd.testing.assert_frame_equal(df, before)
@@ -0,0 +1,39 @@
+import numbers
+import subprocess
+import sys
+
+import pytest
+
+from memory_search import InMemorySearch
+
+CSV_PATH = 'dataset/reviews_data.csv'
+
+# (city, food_type, sort, limit, exact_type)
+SEARCHES = [
+    ('new york', None, 'rating', 10, False),
+    ('york', None, 'price_asc', 10, False),
+    ('new york', None, 'price_desc', 100, False),
+    ('san', 'italian', 'rating', 10, False),
+    ('new', 'pizza', 'price_asc', 25, False),
+    ('', 'bar', 'price_desc', 10, False),
+    ('new york', 'Italian', 'rating', 10, True),
+    ('a', 'Sushi', 'price_desc', 50, True),
+]
+
+def normalize(rows):
+    """Rows with numbers as float so DB and NumPy values compare equal"""
+    return [tuple(float(v) if isinstance(v, numbers.Number) else v for v in row) for row in rows]
+
+@pytest.fixture(scope='module')
+def engine():
+    return InMemorySearch.from_csv(CSV_PATH, use_cache=False)
+
+def test_import_does_not_need_psycopg2():
+    code = "import sys, memory_search; sys.exit('psycopg2' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+@pytest.mark.parametrize('search', SEARCHES)
+def test_matches_database(engine, ui, search):
+    city, food_type, sort, limit, exact_type = search
+    expected = ui.get_restaurants(city, food_type, sort, limit, exact_type)
+    assert normalize(engine.search(city, food_type, sort, limit, exact_type)) == normalize(expected)
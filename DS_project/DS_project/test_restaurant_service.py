@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('tabulate')
+
+from restaurant_service import MAX_BODY_BYTES, HttpFrontend, RestaurantService
+from restaurant_ui import RestaurantUI
+
+class SlowBackend:
+    """Backend whose calls block until released, counting concurrent threads"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.most_running = 0
+        self._lock = threading.Lock()
+
+    def delete_restaurant(self, name):
+        with self._lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            self.release.wait(5)
+            return 1
+        finally:
+            with self._lock:
+                self.running -= 1
+
+async def request(frontend, method, target, body=None):
+    """Send one HTTP request through a real server, returning (status, payload)"""
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    return await send(frontend, f"{method} {target} HTTP/1.1\r\n"
+                                f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+
+async def send(frontend, raw):
+    """Send raw request bytes through a real server, returning (status, payload)"""
+    server = await asyncio.start_server(frontend.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+def test_timeout_covers_waiting_for_a_slot():
+    backend = SlowBackend()
+    
+    async def scenario():
+        service = RestaurantService(backend, max_concurrency=1, timeout=0.2)
+        first = asyncio.ensure_future(service.delete_restaurant('a'))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await service.delete_restaurant('b')
+        waited = time.monotonic() - started
+        with pytest.raises(TimeoutError):
+            await first
+        backend.release.set()
+        return waited
+    
+    try:
+        assert asyncio.run(scenario()) < 0.3
+    finally:
+        backend.release.set()
+
+def test_timed_out_call_keeps_its_slot():
+    backend = SlowBackend()
+    
+    async def scenario():
+        service = RestaurantService(backend, max_concurrency=1, timeout=0.2)
+        with pytest.raises(TimeoutError):
+            await service.delete_restaurant('a')
+        # The first thread still runs, so the next call can't start either
+        with pytest.raises(TimeoutError):
+            await service.delete_restaurant('b')
+        backend.release.set()
+        return await service.delete_restaurant('c')
+    
+    try:
+        assert asyncio.run(scenario()) == 1
+    finally:
+        backend.release.set()
+    assert backend.most_running == 1
+
+@pytest.mark.parametrize('length, status', [('abc', 400), ('-1', 400),
+                                             (str(MAX_BODY_BYTES + 1), 413)])
+def test_bad_content_length_is_answered(length, status):
+    frontend = HttpFrontend(RestaurantService(SlowBackend()))
+    raw = f"POST /restaurants HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode('latin-1')
+    code, payload = asyncio.run(send(frontend, raw))
+    assert code == status and 'error' in payload
+
+@pytest.fixture
+def service(ui):
+    return RestaurantService(ui, max_concurrency=2, timeout=5.0)
+
+def test_search_add_and_delete(service):
+    name = f"Test {uuid.uuid4().hex}"
+    frontend = HttpFrontend(service)
+    record = {'name': name, 'street_address': '1 Test St', 'location': 'Testville',
+              'type': 'Testing, Italian', 'rating': 5, 'review_count': 100000,
+              'contact_number': '555', 'price_range': '$', 'city': 'Testville'}
+    
+    async def scenario():
+        added = await request(frontend, 'POST', '/restaurants', record)
+        found = await request(frontend, 'GET', '/restaurants?city=testville&page_size=5')
+        deleted = await request(frontend, 'DELETE', f"/restaurants?name={name.replace(' ', '+')}")
+        after = await request(frontend, 'GET', '/restaurants?city=testville&page_size=5')
+        stats = await request(frontend, 'GET', '/stats')
+        return added, found, deleted, after, stats
+    
+    added, found, deleted, after, stats = asyncio.run(scenario())
+    assert added[0] == 201 and isinstance(added[1]['id'], int)
+    assert found[0] == 200 and [r['name'] for r in found[1]['restaurants']] == [name]
+    assert deleted == (200, {'deleted': 1})
+    assert after == (200, {'restaurants': [], 'next_token': None})
+    assert stats[0] == 200 and stats[1]['misses'] > 0
+
+def test_database_errors_are_server_errors(ui):
+    broken = RestaurantUI()
+    broken.db_params = dict(ui.db_params, dbname=f"missing_{uuid.uuid4().hex}")
+    frontend = HttpFrontend(RestaurantService(broken, timeout=5.0))
+    status, payload = asyncio.run(request(frontend, 'DELETE', '/restaurants?name=x'))
+    assert status == 500 and 'missing_' in payload['error']
@@ -0,0 +1,80 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sort_orders import SORT_ORDERS
+
+def all_pages(ui, city, food_type, sort, page_size):
+    rows, token = ui.search_page(city, food_type, sort, page_size)
+    while token:
+        page, token = ui.search_page(city, food_type, sort, page_size, token=token)
+        rows.extend(page)
+    return rows
+
+@pytest.mark.parametrize('sort', ['rating', 'price_asc', 'price_desc'])
+@pytest.mark.parametrize('food_type', [None, 'pizza'])
+def test_pages_match_one_search(ui, food_type, sort):
+    expected = ui.get_restaurants('new york', food_type, sort, 1000)
+    assert all_pages(ui, 'new york', food_type, sort, 7) == expected
+
+def test_first_page_is_cached(ui):
+    ui.search_cache.clear()
+    first, token = ui.search_page('dallas', sort='price_asc', page_size=5)
+    hits = ui.search_cache.hits
+    assert ui.search_page('dallas', sort='price_asc', page_size=5) == (first, token)
+    assert ui.search_cache.hits == hits + 1
+
+def test_first_page_matches_get_restaurants(ui):
+    rows, token = ui.search_page('york', sort='rating', page_size=10)
+    assert token is not None
+    assert rows == ui.get_restaurants('york', sort='rating', limit=10)
+
+def test_concurrent_inserts_keep_rankings_whole(ui):
+    city = f"Racetown {uuid.uuid4().hex[:8]}"
+    
+    def insert(i):
+        return ui.insert_restaurant(f"Racer {i}", f"{i} Track Rd", city, 'Diner', i % 5,
+                                    i, '555', '', '', '$', city)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(insert, range(40)))
+        with ui.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT sort_key, count(*), count(DISTINCT id)
+                FROM restaurant_top_n WHERE city_key = lower(%s)
+                GROUP BY sort_key
+            """, (city,))
+            counts = {sort: (rows, distinct) for sort, rows, distinct in cur.fetchall()}
+        assert counts == {sort: (40, 40) for sort in SORT_ORDERS}
+        assert len({row[0] for row in ui.get_restaurants(city, limit=10)}) == 10
+    finally:
+        with ui.connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM restaurants WHERE city = %s", (city,))
+            cur.execute("SELECT refresh_restaurant_top_n(ARRAY[lower(%s)])", (city,))
+            conn.commit()
+
+@pytest.mark.parametrize('min_connections', [None, 1])
+def test_pool_keeps_prepared_connections(ui, min_connections):
+    from restaurant_ui import RestaurantUI
+    pooled = RestaurantUI(min_connections=min_connections, max_connections=4, cache_size=0)
+    pooled.db_params = ui.db_params
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: pooled.get_restaurants('york', sort='rating'), range(200)))
+        # Connections the pool closed are forgotten with their statements
+        assert all(not conn.closed for conn in pooled._prepared)
+        if min_connections is None:
+            assert len(pooled._prepared) <= 4
+    finally:
+        pooled.close_db()
+
+@pytest.mark.parametrize('typed', ['$$ - $$$', '$$-$$$', '$$ -$$$', '$$- $$$'])
+def test_price_range_variants_are_stored_alike(typed):
+    restaurant_ui = pytest.importorskip('restaurant_ui')
+    record = dict(name='Spacing', street_address='1 Dash St', location='Here',
+                  type='Diner', rating=4, review_count=1,
+                  contact_number='+1 555-0100', price_range=typed, city='Anytown')
+    values = restaurant_ui.validate_review(record)
+    assert values[restaurant_ui.REVIEW_FIELDS.index('price_range')] == '$$ - $$$'
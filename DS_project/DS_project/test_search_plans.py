@@ -0,0 +1,69 @@
+import pytest
+
+from instrumentation import metrics
+from restaurant_ui import RestaurantUI
+from sort_orders import TOP_N
+
+# Prepared statements switch to a generic plan after five executions; force
+# it from the start so the plans checked are the ones served later. Seq
+# scans are disabled because a test database is small enough that the
+# planner would rightly prefer them; what matters is that an index can
+# serve the parameterised filter at all.
+PLAN_OPTIONS = '-c plan_cache_mode=force_generic_plan -c enable_seqscan=off'
+
+@pytest.fixture(scope='module')
+def planner(ui):
+    explain_ui = RestaurantUI(cache_size=0)
+    explain_ui.db_params = dict(ui.db_params, options=PLAN_OPTIONS)
+    with explain_ui.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename IN ('restaurants', 'restaurant_top_n')")
+        explain_ui.indexes = {row[0] for row in cur.fetchall()}
+    yield explain_ui
+    explain_ui.close_db()
+
+def captured_plan(search):
+    """Plan of the single query run by search(), via the slow query log"""
+    metrics.reset()
+    metrics.enable(slow_query_threshold=0)
+    try:
+        search()
+        plan = metrics.slow_queries[-1]['plan']
+    finally:
+        metrics.disable()
+        metrics.reset()
+    return plan
+
+def assert_uses(planner, plan, *indexes):
+    """The plan is generic and reads through one of indexes, never a seq scan"""
+    available = [name for name in indexes if name in planner.indexes]
+    if not available:
+        pytest.skip(f"{' / '.join(indexes)} not created (pg_trgm missing?)")
+    assert '$1' in plan, plan
+    assert 'Seq Scan' not in plan, plan
+    assert any(name in plan for name in available), plan
+
+@pytest.mark.parametrize('sort', ['rating', 'price_asc', 'price_desc'])
+def test_city_search_uses_trigram_index(planner, sort):
+    plan = captured_plan(lambda: planner._query_restaurants('york', None, sort, TOP_N + 1))
+    assert_uses(planner, plan, 'idx_restaurants_city_trgm')
+
+def test_type_search_uses_trigram_index(planner):
+    plan = captured_plan(lambda: planner._query_restaurants('york', 'italian', 'rating', 10))
+    assert_uses(planner, plan, 'idx_restaurants_type_trgm', 'idx_restaurants_city_trgm')
+
+def test_cuisine_search_uses_array_index(planner):
+    plan = captured_plan(lambda: planner._query_restaurants('york', 'Italian', 'rating', 10,
+                                                            exact_type=True))
+    assert_uses(planner, plan, 'idx_restaurants_cuisines')
+
+@pytest.mark.parametrize('sort', ['rating', 'price_asc', 'price_desc'])
+def test_top_n_search_uses_trigram_index(planner, sort):
+    plan = captured_plan(lambda: planner._query_restaurants('york', None, sort, 10))
+    assert_uses(planner, plan, 'idx_restaurant_top_n_city_trgm')
+
+def test_next_page_uses_index(planner):
+    _, token = planner.search_page('york', sort='rating', page_size=5)
+    assert token is not None
+    plan = captured_plan(lambda: planner.search_page('york', sort='rating', page_size=5,
+                                                     token=token))
+    assert_uses(planner, plan, 'idx_restaurants_city_trgm', 'idx_restaurants_city_rating')
@@ -0,0 +1,76 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+import url_shortener
+from url_shortener import UrlCache, UrlShortener
+
+class CountingShortener:
+    """Stub for the TinyURL client that records every URL it is asked for"""
+    def __init__(self, block=()):
+        self.calls = []
+        self.block = set(block)
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        with self._lock:
+            self.calls.append(url)
+        if url in self.block:
+            self.release.wait()
+        return f"short:{url}"
+
+@pytest.fixture
+def stub():
+    stub = CountingShortener()
+    yield stub
+    stub.release.set()
+
+@pytest.fixture
+def shortener(stub):
+    shortener = UrlShortener(stub, cache=UrlCache(':memory:'), page_timeout=0.2)
+    yield shortener
+    shortener.close()
+
+def test_cached_urls_need_no_requests(shortener, stub):
+    urls = ['http://a', 'http://b', 'http://a', 'Check The Website For A Menu']
+    expected = ['short:http://a', 'short:http://b', 'short:http://a', 'N/A']
+    assert shortener.shorten_many(urls) == expected
+    assert sorted(stub.calls) == ['http://a', 'http://b']
+
+    stub.calls.clear()
+    assert shortener.shorten_many(urls) == expected
+    assert stub.calls == []
+
+def test_slow_urls_are_shown_in_full(shortener, stub):
+    stub.block.add('http://slow')
+    start = time.monotonic()
+    assert shortener.shorten_many(['http://fast', 'http://slow']) \
+        == ['short:http://fast', 'http://slow']
+    assert time.monotonic() - start < 1.0
+
+    # The late result is still cached for the next page
+    stub.release.set()
+    deadline = time.monotonic() + 2.0
+    while not shortener.cache.get_many(['http://slow']) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stub.calls.clear()
+    assert shortener.shorten_many(['http://slow']) == ['short:http://slow']
+    assert stub.calls == []
+
+def test_cache_evicts_least_recently_used(monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(url_shortener.time, 'time', lambda: next(clock))
+    cache = UrlCache(':memory:', max_entries=2)
+    try:
+        cache.put('http://a', 'short:a')
+        cache.put('http://b', 'short:b')
+        # Reading a makes b the oldest entry
+        assert cache.get_many(['http://a']) == {'http://a': 'short:a'}
+        cache.put('http://c', 'short:c')
+        assert cache.get_many(['http://a', 'http://b', 'http://c']) \
+            == {'http://a': 'short:a', 'http://c': 'short:c'}
+    finally:
+        cache.close()
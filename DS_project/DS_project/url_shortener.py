@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '.cache', 'short_urls.sqlite3')
+
+def tinyurl_shortener():
+    """Default shortener: one blocking TinyURL request per call"""
+    from pyshorteners import Shortener
+    return Shortener().tinyurl.short
+
+class UrlCache:
+    """Persistent URL -> short URL map in SQLite, evicting least recently used entries"""
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=10000):
+        self.max_entries = max_entries
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Late shortening results are stored from worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS short_urls (
+                    url TEXT PRIMARY KEY,
+                    short_url TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_short_urls_last_used ON short_urls (last_used)")
+
+    def get_many(self, urls):
+        """Return {url: short_url} for the cached urls and mark them as used"""
+        urls = list(set(urls))
+        if not urls:
+            return {}
+        with self._lock, self._conn:
+            placeholders = ', '.join('?' * len(urls))
+            found = dict(self._conn.execute(
+                f"SELECT url, short_url FROM short_urls WHERE url IN ({placeholders})", urls))
+            if found:
+                self._conn.execute(
+                    f"UPDATE short_urls SET last_used = ? WHERE url IN ({', '.join('?' * len(found))})",
+                    [time.time(), *found])
+            return found
+
+    def put(self, url, short_url):
+        """Store one mapping, evicting the oldest entries beyond max_entries"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO short_urls (url, short_url, last_used) VALUES (?, ?, ?)",
+                (url, short_url, time.time()))
+            self._conn.execute("""
+                DELETE FROM short_urls WHERE url IN (
+                    SELECT url FROM short_urls ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class UrlShortener:
+    """Shortens a page of URLs concurrently, behind a persistent cache.
+    
+    shorten is any callable taking a URL and returning its short form, so
+    tests can pass a local stub instead of the TinyURL client. URLs not
+    shortened within page_timeout are shown in full; their results are
+    still cached when they arrive.
+    """
+    def __init__(self, shorten=None, cache=None, max_workers=8, page_timeout=5.0):
+        self._shorten = shorten
+        self.cache = cache if cache is not None else UrlCache()
+        self.page_timeout = page_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _shorten_and_cache(self, url):
+        if self._shorten is None:
+            self._shorten = tinyurl_shortener()
+        short_url = self._shorten(url)
+        self.cache.put(url, short_url)
+        return short_url
+
+    def shorten_many(self, urls):
+        """Return the short form of each url, in order"""
+        wanted = [url for url in urls if not is_placeholder(url)]
+        short = self.cache.get_many(wanted)
+        
+        # One request per distinct uncached URL, all in flight together
+        futures = {url: self._executor.submit(self._shorten_and_cache, url)
+                   for url in set(wanted) - set(short)}
+        if futures:
+            done, _ = wait(futures.values(), timeout=self.page_timeout)
+            for url, future in futures.items():
+                if future in done and future.exception() is None:
+                    short[url] = future.result()
+        
+        return ['N/A' if is_placeholder(url) else short.get(url, url) for url in urls]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.cache.close()
+
+def is_placeholder(url):
+    """True for values that aren't real URLs"""
+    return not url or url.lower() == 'check the website for a menu'
@@ -1,113 +1,1086 @@
 # Save this as distributed_example.py
 
-from multiprocessing.managers import BaseManager
+from multiprocessing.managers import BaseManager, RemoteError
 from multiprocessing import Lock, Value, Process, Manager
+from multiprocessing import resource_tracker, shared_memory, util
+from contextlib import contextmanager
+import bisect
+import functools
+import hashlib
 import threading
 import time
-import queue
 import uuid
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# How long a client may serve reads from its local copy, in seconds. A
+# write waits until other clients' leases on the key have run out, so keep
+# this short; leases are opt-in per DistObj
+LEASE_DURATION = 0.05
+
+# Key used by callers that only need the one shared value
+DEFAULT_KEY = 'default'
+
+# Points per shard on the hash ring
+RING_REPLICAS = 64
+
+# Buffers at least this large go through shared memory instead of being
+# pickled through the manager, when every shard is on this host
+SHM_THRESHOLD = 1 << 20
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# Clients heartbeat every HEARTBEAT_INTERVAL seconds and are dropped, along
+# with any locks they hold, after CLIENT_TIMEOUT seconds of silence
+HEARTBEAT_INTERVAL = 1.0
+CLIENT_TIMEOUT = 3.0
+
+class KeyMoved(Exception):
+    # Raised by a shard for a key it has handed over during a rebalance.
+    # Carries the address of the shard that owns the key now.
+    def __init__(self, key, address):
+        super().__init__(key, address)
+        self.key = key
+        self.address = address
+
+class ClientExpired(Exception):
+    # The manager no longer knows this client: it missed its heartbeats and
+    # the locks it held were given back
+    pass
+
+class LockNotHeld(Exception):
+    # set() was called by a client that doesn't hold the key's write lock
+    pass
+
+class SharedBuffer:
+    # Stands in for a large buffer whose bytes live in a shared memory
+    # segment. Only this descriptor passes through the manager.
+    def __init__(self, name, nbytes, format='B', shape=None, dtype=None):
+        self.name = name
+        self.nbytes = nbytes
+        self.format = format
+        self.shape = shape
+        self.dtype = dtype
+
+def _untrack(shm):
+    # The resource tracker of the process that opened a segment unlinks it
+    # when that process exits. Segments belong to the manager, which unlinks
+    # them once the value is replaced, so keep the trackers out of it.
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+class _Segment(shared_memory.SharedMemory):
+    def __del__(self):
+        # Views handed to callers may outlive this object; the mapping is
+        # released with the last of them instead
+        try:
+            self.close()
+        except BufferError:
+            pass
+
+def export_buffer(value):
+    # Copy a large contiguous buffer into a new segment. Returns None for
+    # anything that should take the ordinary pickling path.
+    if np is not None and isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return None
+        value = np.ascontiguousarray(value)
+        view = memoryview(value.reshape(-1).view(np.uint8))
+        dtype = value.dtype.str
+    else:
+        try:
+            view = memoryview(value)
+        except TypeError:
+            return None
+        if not view.c_contiguous:
+            return None
+        dtype = None
+    if view.nbytes < SHM_THRESHOLD:
+        return None
+    
+    shm = shared_memory.SharedMemory(create=True, size=view.nbytes)
+    _untrack(shm)
+    try:
+        shm.buf[:view.nbytes] = view.cast('B')
+    except Exception:
+        shm.close()
+        unlink_buffer(shm.name)
+        raise
+    descriptor = SharedBuffer(shm.name, view.nbytes, view.format,
+                              value.shape if dtype else view.shape, dtype)
+    shm.close()
+    return descriptor
+
+def unlink_buffer(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    # unlink() drops the tracker entry that attaching just added
+    shm.close()
+    shm.unlink()
+
 class SharedState:
     def __init__(self, initial_value=None):
         self.value = initial_value
+        self.version = 0
         self.lock = threading.Lock()
     
     def get_value(self):
         with self.lock:
             return self.value
+    
+    def get_versioned(self):
+        with self.lock:
+            return self.value, self.version
             
-    def set_value(self, new_value):
+    def set_value(self, new_value, versions=1):
+        # versions > 1 records several changes applied at once
         with self.lock:
+            old_value = self.value
             self.value = new_value
+            self.version += versions
+            version = self.version
+        # Readers that already mapped the old segment keep their mapping;
+        # the name just stops resolving
+        if isinstance(old_value, SharedBuffer) and old_value is not new_value:
+            unlink_buffer(old_value.name)
+        return version
+
+class ReadWriteLock:
+    # Many readers or one writer. A waiting writer blocks new readers so a
+    # steady stream of reads can't starve writes.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+    
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+# Read-modify-write operations run inside the manager. Each takes the
+# current value and version and returns (changed, new_value, result).
+def _op_get(value, version):
+    return False, value, value
+
+def _op_set(value, version, new_value):
+    return True, new_value, None
+
+def _op_compare_and_swap(value, version, expected_version, new_value):
+    if version != expected_version:
+        return False, value, False
+    return True, new_value, True
+
+def _plain(value, name):
+    # A value kept in shared memory is only a descriptor here
+    if isinstance(value, SharedBuffer):
+        raise TypeError(f"{name} isn't supported on a buffer kept in shared memory")
+    return value
+
+def _op_increment(value, version, delta=1):
+    new_value = (_plain(value, 'increment') or 0) + delta
+    return True, new_value, new_value
+
+def _op_append(value, version, item):
+    new_value = list(_plain(value, 'append') or [])
+    new_value.append(item)
+    return True, new_value, len(new_value)
+
+ATOMIC_OPS = {
+    'get': _op_get,
+    'set': _op_set,
+    'compare_and_swap': _op_compare_and_swap,
+    'increment': _op_increment,
+    'append': _op_append,
+}
+
+def _rpc(method):
+    # Record calls, service time and time spent waiting for locks and
+    # leases per exposed method. Calls made from inside another RPC count
+    # towards the outer one.
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        waits = self._waits
+        if getattr(waits, 'active', False):
+            return method(self, *args, **kwargs)
+        waits.active = True
+        waits.lock = waits.lease = 0.0
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            waits.active = False
+            self._record(name, time.perf_counter() - start, waits.lock, waits.lease)
+    return wrapper
+
+class StoreEntry:
+    # One named object: its value, its own lock and its outstanding leases
+    def __init__(self, value=None, version=0):
+        self.state = SharedState(value)
+        self.state.version = version
+        self.rwlock = ReadWriteLock()
+        self.lease_lock = threading.Lock()
+        # client id -> expiry of the lease that client holds
+        self.leases = {}
+        # Writers waiting for leases to run out; no new ones are granted
+        # meanwhile, so the wait can't keep growing
+        self.lease_waiters = 0
 
 class TokenManager:
-    def __init__(self, total_processes=1):
-        self._total_processes = Value('i', total_processes)
-        self._available_tokens = Value('i', total_processes)
-        self._lock = Lock()
-        self._token_queue = queue.Queue()
-        for _ in range(total_processes):
-            self._token_queue.put(1)
-        self._shared_state = SharedState()
+    # Lives in the manager process and holds one shard of the keyed store.
+    # Each method is one round trip for a client, and locks are granted
+    # server side per key, so unrelated keys never wait on each other.
+    def __init__(self, lease_duration=LEASE_DURATION, client_timeout=CLIENT_TIMEOUT):
+        self._lease_duration = lease_duration
+        self._client_timeout = client_timeout
+        self._entries = {}
+        self._moved = {}
+        self._entries_lock = threading.Lock()
+        # Signalled when an imported entry arrives
+        self._entries_cond = threading.Condition(self._entries_lock)
+        # Shards learn the ring and their own address on a rebalance; until
+        # then they accept every key they are sent
+        self._ring = None
+        self._address = None
+        self._importing = False
+        # Membership: last heartbeat per client, and the locks each client
+        # took with acquire_read/acquire_write and hasn't released yet
+        self._clients = {}
+        self._holds = {}
+        self._clients_lock = threading.Lock()
+        self._reaper = threading.Thread(target=self._reap_clients, daemon=True)
+        self._reaper.start()
+        # Per-method counters for get_stats()
+        self._waits = threading.local()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+    
+    def _record(self, name, service, lock_wait, lease_wait):
+        with self._stats_lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += service
+            stats[2] += lock_wait
+            stats[3] += lease_wait
+    
+    def _note_wait(self, kind, seconds):
+        waits = self._waits
+        if getattr(waits, 'active', False):
+            setattr(waits, kind, getattr(waits, kind) + seconds)
     
+    def _acquire_entry(self, entry, write):
+        start = time.perf_counter()
+        if write:
+            entry.rwlock.acquire_write()
+            release = entry.rwlock.release_write
+        else:
+            entry.rwlock.acquire_read()
+            release = entry.rwlock.release_read
+        self._note_wait('lock', time.perf_counter() - start)
+        return release
+    
+    def get_stats(self):
+        # {method: {calls, service_s, lock_wait_s, lease_wait_s}} since the
+        # last reset. Service time is measured inside the manager, so the
+        # rest of a client's round trip is transport.
+        with self._stats_lock:
+            return {name: {'calls': calls, 'service_s': service,
+                           'lock_wait_s': lock_wait, 'lease_wait_s': lease_wait}
+                    for name, (calls, service, lock_wait, lease_wait)
+                    in self._stats.items()}
+    
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+    
+    def _entry(self, key):
+        with self._entries_cond:
+            while True:
+                if key in self._moved:
+                    raise KeyMoved(key, self._moved[key])
+                entry = self._entries.get(key)
+                if entry is not None:
+                    # Held entries are served until they are handed over
+                    return entry
+                # A client on an outdated ring must not create a key here
+                # that another shard owns
+                owner = self._ring.get(key) if self._ring is not None else self._address
+                if owner != self._address:
+                    raise KeyMoved(key, owner)
+                if not self._importing:
+                    break
+                # The key may still be on its way from its old shard
+                self._entries_cond.wait()
+            entry = self._entries[key] = StoreEntry()
+            return entry
+    
+    @contextmanager
+    def _locked(self, key, write=False):
+        # The entry can be handed to another shard while we wait for its
+        # lock, so check it is still ours once the lock is held
+        while True:
+            entry = self._entry(key)
+            release = self._acquire_entry(entry, write)
+            with self._entries_lock:
+                current = self._entries.get(key) is entry
+            if current:
+                break
+            release()
+        try:
+            yield entry
+        finally:
+            release()
+    
+    @_rpc
+    def register_client(self, client_id):
+        with self._clients_lock:
+            self._clients[client_id] = time.monotonic()
+            self._holds.setdefault(client_id, [])
+        return client_id
+    
+    @_rpc
+    def heartbeat(self, client_id):
+        # False tells the client it expired and has to register again
+        with self._clients_lock:
+            if client_id not in self._clients:
+                return False
+            self._clients[client_id] = time.monotonic()
+            return True
+    
+    @_rpc
+    def unregister_client(self, client_id):
+        self._drop_clients([client_id])
+    
+    def _reap_clients(self):
+        while True:
+            time.sleep(min(HEARTBEAT_INTERVAL, self._client_timeout / 2))
+            deadline = time.monotonic() - self._client_timeout
+            with self._clients_lock:
+                expired = [c for c, seen in self._clients.items() if seen < deadline]
+            if expired:
+                self._drop_clients(expired)
+    
+    def _drop_clients(self, client_ids):
+        # Give back every lock the clients still held
+        with self._clients_lock:
+            holds = []
+            for client_id in client_ids:
+                self._clients.pop(client_id, None)
+                holds.extend(self._holds.pop(client_id, []))
+        for key, mode in holds:
+            with self._entries_lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if mode == 'write':
+                entry.rwlock.release_write()
+            else:
+                entry.rwlock.release_read()
+    
+    def _track_hold(self, client_id, key, mode):
+        with self._clients_lock:
+            if client_id not in self._clients:
+                return False
+            self._holds[client_id].append((key, mode))
+            return True
+    
+    def _untrack_hold(self, client_id, key, mode):
+        with self._clients_lock:
+            try:
+                self._holds[client_id].remove((key, mode))
+            except (KeyError, ValueError):
+                raise ClientExpired(client_id)
+    
+    @_rpc
     def get_total_processes(self):
-        with self._total_processes.get_lock():
-            return self._total_processes.value
+        # Live clients only; expired ones drop out
+        with self._clients_lock:
+            return len(self._clients)
     
-    def get_shared_value(self):
-        return self._shared_state.get_value()
+    @_rpc
+    def get_shared_value(self, key=DEFAULT_KEY):
+        return self._entry(key).state.get_value()
     
-    def set_shared_value(self, value):
-        self._shared_state.set_value(value)
-            
-    def acquire_tokens(self, count):
-        acquired = 0
-        while acquired < count:
-            token = self._token_queue.get()
-            acquired += 1
-        with self._available_tokens.get_lock():
-            self._available_tokens.value -= count
-    
-    def release_tokens(self, count):
-        for _ in range(count):
-            self._token_queue.put(1)
-        with self._available_tokens.get_lock():
-            self._available_tokens.value += count
+    @_rpc
+    def set_shared_value(self, value, key=DEFAULT_KEY, client_id=None):
+        # Only for a client holding the key's write lock via acquire_write.
+        # No lease can be granted while it holds the lock, so the leases
+        # still out are waited for once; the lock is the client's, not ours.
+        entry = self._entry(key)
+        remaining = self._lease_remaining(entry, client_id)
+        if remaining > 0:
+            time.sleep(remaining)
+            self._note_wait('lease', remaining)
+        # Checked and stored under the membership lock, so the reaper can't
+        # hand the write lock to someone else in between
+        with self._clients_lock:
+            if client_id not in self._clients:
+                raise ClientExpired(client_id)
+            if (key, 'write') not in self._holds[client_id]:
+                raise LockNotHeld(key)
+            return entry.state.set_value(value)
+    
+    def _acquire(self, key, mode, client_id):
+        # Locks held across calls are tied to a client, so they can be
+        # reclaimed if it dies before releasing them
+        release = self._acquire_entry(self._entry(key), mode == 'write')
+        if client_id is not None and not self._track_hold(client_id, key, mode):
+            release()
+            raise ClientExpired(client_id)
+    
+    def _release(self, key, mode, client_id):
+        if client_id is not None:
+            self._untrack_hold(client_id, key, mode)
+        entry = self._entry(key)
+        if mode == 'write':
+            entry.rwlock.release_write()
+        else:
+            entry.rwlock.release_read()
+    
+    @_rpc
+    def acquire_read(self, key=DEFAULT_KEY, client_id=None):
+        self._acquire(key, 'read', client_id)
+    
+    @_rpc
+    def release_read(self, key=DEFAULT_KEY, client_id=None):
+        self._release(key, 'read', client_id)
+    
+    @_rpc
+    def acquire_write(self, key=DEFAULT_KEY, client_id=None):
+        self._acquire(key, 'write', client_id)
+    
+    @_rpc
+    def release_write(self, key=DEFAULT_KEY, client_id=None):
+        self._release(key, 'write', client_id)
     
+    @_rpc
+    def read_value(self, key=DEFAULT_KEY):
+        # Acquire, read and release in a single call
+        with self._locked(key) as entry:
+            return entry.state.get_value()
+    
+    @_rpc
+    def get_version(self, key=DEFAULT_KEY):
+        return self._entry(key).state.get_versioned()[1]
+    
+    @_rpc
+    def read_lease(self, key=DEFAULT_KEY, client_id=None):
+        # Returns (value, version, duration). The client may keep serving
+        # the value locally for `duration` seconds; 0 means no lease, which
+        # is what clients get while a writer waits for leases to run out.
+        with self._locked(key) as entry:
+            value, version = entry.state.get_versioned()
+            with entry.lease_lock:
+                if entry.lease_waiters:
+                    return value, version, 0.0
+                entry.leases[client_id] = time.monotonic() + self._lease_duration
+            return value, version, self._lease_duration
+    
+    def _lease_remaining(self, entry, client_id):
+        # Seconds until every lease not held by client_id has run out. The
+        # writing client dropped its own copy before calling, so its lease
+        # is given back rather than waited for.
+        now = time.monotonic()
+        with entry.lease_lock:
+            entry.leases.pop(client_id, None)
+            for holder, expires in list(entry.leases.items()):
+                if expires <= now:
+                    del entry.leases[holder]
+            return max(entry.leases.values(), default=now) - now
+    
+    @contextmanager
+    def _write_locked(self, key, client_id=None):
+        # The write lock, taken once no other client holds a lease on the
+        # key. Leases are waited out with the lock released, so reads carry
+        # on (without new leases) and other keys' writers aren't held up.
+        blocked = None
+        try:
+            while True:
+                with self._locked(key, write=True) as entry:
+                    remaining = self._lease_remaining(entry, client_id)
+                    if remaining <= 0:
+                        self._unblock_leases(blocked)
+                        blocked = None
+                        yield entry
+                        return
+                    if blocked is not entry:
+                        self._unblock_leases(blocked)
+                        with entry.lease_lock:
+                            entry.lease_waiters += 1
+                        blocked = entry
+                time.sleep(remaining)
+                self._note_wait('lease', remaining)
+        finally:
+            self._unblock_leases(blocked)
+    
+    def _unblock_leases(self, entry):
+        if entry is not None:
+            with entry.lease_lock:
+                entry.lease_waiters -= 1
+    
+    @_rpc
+    def write_value(self, value, key=DEFAULT_KEY, client_id=None):
+        with self._write_locked(key, client_id) as entry:
+            return entry.state.set_value(value)
+    
+    @_rpc
+    def read_versioned(self, key=DEFAULT_KEY):
+        with self._locked(key) as entry:
+            return entry.state.get_versioned()
+    
+    @_rpc
+    def batch(self, ops, key=DEFAULT_KEY, client_id=None):
+        # Apply a list of (name, *args) operations to one key under a single
+        # write lock. Returns one result per operation; the version moves
+        # once per operation that changed the value. If an operation fails
+        # nothing is stored.
+        for op in ops:
+            if op[0] not in ATOMIC_OPS:
+                raise ValueError(f"Unknown operation: {op[0]}")
+        with self._write_locked(key, client_id) as entry:
+            original, version = entry.state.get_versioned()
+            value = original
+            changes = 0
+            results = []
+            for name, *args in ops:
+                changed, value, result = ATOMIC_OPS[name](value, version + changes, *args)
+                changes += changed
+                results.append(result)
+            if changes:
+                # Storing the new value unlinks the old segment, so a
+                # descriptor returned for it could never be mapped
+                if isinstance(original, SharedBuffer) and any(r is original for r in results):
+                    raise ValueError("A batch can't read a buffer kept in shared memory "
+                                     "and replace it; read it first")
+                entry.state.set_value(value, changes)
+            return results
+    
+    @_rpc
+    def compare_and_swap(self, expected_version, value, key=DEFAULT_KEY, client_id=None):
+        # Returns (swapped, current version). A stale version fails without
+        # waiting for leases, since nothing changes.
+        with self._locked(key) as entry:
+            version = entry.state.get_versioned()[1]
+        if version != expected_version:
+            return False, version
+        with self._write_locked(key, client_id) as entry:
+            if entry.state.get_versioned()[1] != expected_version:
+                return False, entry.state.get_versioned()[1]
+            return True, entry.state.set_value(value)
+    
+    @_rpc
+    def increment(self, delta=1, key=DEFAULT_KEY, client_id=None):
+        return self.batch([('increment', delta)], key=key, client_id=client_id)[0]
+    
+    @_rpc
+    def append(self, item, key=DEFAULT_KEY, client_id=None):
+        return self.batch([('append', item)], key=key, client_id=client_id)[0]
+    
+    @_rpc
+    def keys(self):
+        with self._entries_lock:
+            return list(self._entries)
+    
+    def unlink_buffers(self):
+        # Run when the manager process exits: the segments still holding a
+        # current value have no one else to unlink them
+        with self._entries_lock:
+            values = [entry.state.get_value() for entry in self._entries.values()]
+        for value in values:
+            if isinstance(value, SharedBuffer):
+                unlink_buffer(value.name)
+    
+    @_rpc
+    def pop_entry(self, key, address):
+        # Hand a key over to the shard at `address`. Returns (value, version)
+        # and answers later requests for the key with KeyMoved.
+        with self._write_locked(key) as entry:
+            value, version = entry.state.get_versioned()
+            with self._entries_lock:
+                del self._entries[key]
+                self._moved[key] = address
+            return value, version
+    
+    @_rpc
+    def import_entry(self, key, value, version):
+        with self._entries_cond:
+            self._moved.pop(key, None)
+            self._entries[key] = StoreEntry(value, version)
+            self._entries_cond.notify_all()
+    
+    @_rpc
+    def set_ring(self, nodes, address, importing=False):
+        # Tell the shard the current ring and which node it is. From then
+        # on it refuses to create keys owned by another shard. A shard
+        # joining with importing=True holds back requests for keys it
+        # doesn't have until they are imported or finish_import is called.
+        with self._entries_cond:
+            self._ring = HashRing([tuple(node) for node in nodes])
+            self._address = tuple(address)
+            self._importing = importing
+            self._entries_cond.notify_all()
+    
+    @_rpc
+    def finish_import(self):
+        # Every key that was going to move here has arrived
+        with self._entries_cond:
+            self._importing = False
+            self._entries_cond.notify_all()
+    
+    @_rpc
     def add_process(self):
-        with self._total_processes.get_lock():
-            self._total_processes.value += 1
-            self._token_queue.put(1)
+        # Kept for older clients; such a member never heartbeats, so it
+        # expires after CLIENT_TIMEOUT
+        return self.register_client(str(uuid.uuid4()))
+
+# Every client has to talk to the same TokenManager, so the manager server
+# hands out one shared instance instead of creating one per connection
+_token_manager = None
+_token_manager_lock = threading.Lock()
+
+def get_token_manager():
+    global _token_manager
+    with _token_manager_lock:
+        if _token_manager is None:
+            _token_manager = TokenManager()
+            # The server process ends with os._exit, which skips atexit but
+            # still runs multiprocessing finalizers
+            util.Finalize(_token_manager, _token_manager.unlink_buffers,
+                          exitpriority=0)
+        return _token_manager
+
+class DistObjManager(BaseManager):
+    pass
+
+DistObjManager.register('TokenManager', get_token_manager,
+                        exposed=['acquire_read', 'release_read',
+                                 'acquire_write', 'release_write',
+                                 'read_value', 'write_value',
+                                 'read_lease', 'get_version',
+                                 'read_versioned', 'compare_and_swap',
+                                 'increment', 'append', 'batch',
+                                 'keys', 'pop_entry', 'import_entry',
+                                 'set_ring', 'finish_import',
+                                 'register_client', 'heartbeat',
+                                 'unregister_client',
+                                 'add_process', 'get_total_processes',
+                                 'get_stats', 'reset_stats',
+                                 'get_shared_value', 'set_shared_value'])
+
+def start_server(host='localhost', port=50000):
+    # Run the manager in its own process, independent of any worker
+    manager = DistObjManager(address=(host, port), authkey=b'secret')
+    manager.start()
+    return manager
+
+def shard_addresses(host='localhost', base_port=50000, num_shards=1):
+    return [(host, base_port + i) for i in range(num_shards)]
+
+def start_servers(host='localhost', base_port=50000, num_shards=1):
+    return [start_server(h, p) for h, p in shard_addresses(host, base_port, num_shards)]
+
+def _ring_hash(text):
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:16], 16)
+
+class HashRing:
+    # Consistent hashing: adding a shard only moves the keys that land on
+    # its points, roughly 1/N of the total
+    def __init__(self, nodes=(), replicas=RING_REPLICAS):
+        self._replicas = replicas
+        self._points = []
+        self._owners = {}
+        for node in nodes:
+            self.add(node)
+    
+    def add(self, node):
+        for i in range(self._replicas):
+            point = _ring_hash(f"{node[0]}:{node[1]}#{i}")
+            bisect.insort(self._points, point)
+            self._owners[point] = node
+    
+    def get(self, key):
+        if not self._points:
+            raise LookupError("Hash ring has no shards")
+        index = bisect.bisect(self._points, _ring_hash(str(key)))
+        return self._owners[self._points[index % len(self._points)]]
+    
+    def nodes(self):
+        return list(dict.fromkeys(self._owners.values()))
+
+class ShardedStore:
+    # Client side of the store: routes every key to the shard that owns it
+    def __init__(self, addresses, authkey=b'secret', client_id=None):
+        self._authkey = authkey
+        self._client_id = client_id
+        self._ring = HashRing()
+        self._managers = {}
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+        # Client-side round trips per method: [calls, seconds]
+        self.rpc_stats = {}
+        self._rpc_lock = threading.Lock()
+        for address in addresses:
+            self._attach(tuple(address))
+    
+    def _attach(self, address, start=False):
+        with self._lock:
+            if address in self._shards:
+                return self._shards[address]
+            manager = DistObjManager(address=address, authkey=self._authkey)
+            try:
+                manager.connect()
+            except (ConnectionRefusedError, OSError):
+                if not start:
+                    raise
+                manager.start()
+            self._managers[address] = manager
+            self._shards[address] = manager.TokenManager()
+            if self._client_id is not None:
+                self._shards[address].register_client(self._client_id)
+            self._ring.add(address)
+            return self._shards[address]
+    
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat, args=(interval,), daemon=True)
+        self._heartbeat_thread.start()
+    
+    def _heartbeat(self, interval):
+        while not self._stop.wait(interval):
+            with self._lock:
+                shards = list(self._shards.values())
+            for shard in shards:
+                try:
+                    if not shard.heartbeat(self._client_id):
+                        shard.register_client(self._client_id)
+                except (OSError, EOFError, RemoteError):
+                    # Shard unreachable; try again on the next beat
+                    pass
+    
+    def close(self):
+        self._stop.set()
+        if self._client_id is None:
+            return
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            try:
+                shard.unregister_client(self._client_id)
+            except (OSError, EOFError):
+                pass
+    
+    def connect(self, addresses, start=False):
+        for address in addresses:
+            self._attach(tuple(address), start=start)
+    
+    def shard(self, key):
+        with self._lock:
+            return self._shards[self._ring.get(key)]
+    
+    @property
+    def primary(self):
+        with self._lock:
+            return next(iter(self._shards.values()))
+    
+    def call(self, method, key, *args, **kwargs):
+        while True:
+            start = time.perf_counter()
+            try:
+                return getattr(self.shard(key), method)(*args, key=key, **kwargs)
+            except KeyMoved as e:
+                # Another client has rebalanced; learn about the new shard
+                self._attach(tuple(e.address))
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._rpc_lock:
+                    stats = self.rpc_stats.setdefault(method, [0, 0.0])
+                    stats[0] += 1
+                    stats[1] += elapsed
+    
+    def shards(self):
+        with self._lock:
+            return list(self._shards.values())
+    
+    def keys(self):
+        with self._lock:
+            shards = list(self._shards.values())
+        result = []
+        for shard in shards:
+            result.extend(shard.keys())
+        return result
+    
+    def add_shard(self, address, start=False):
+        # Join a new shard and move over the keys the ring now assigns to it
+        address = tuple(address)
+        with self._lock:
+            old_shards = dict(self._shards)
+        target = self._attach(address, start=start)
+        with self._lock:
+            nodes = self._ring.nodes()
+        # Requests for the new shard's keys wait there until the keys arrive
+        target.set_ring(nodes, address, importing=True)
+        moved = 0
+        try:
+            # Old shards stop creating keys the new shard owns before their
+            # keys are listed, so a client on the old ring can't leave a
+            # key behind
+            for owner, shard in old_shards.items():
+                shard.set_ring(nodes, owner)
+            for owner, shard in old_shards.items():
+                for key in shard.keys():
+                    if self._ring.get(key) != address:
+                        continue
+                    value, version = shard.pop_entry(key, address)
+                    target.import_entry(key, value, version)
+                    moved += 1
+        finally:
+            target.finish_import()
+        return moved
 
 class DistObj:
-    def __init__(self, val=None):
+    def __init__(self, val=None, use_lease=False, key=DEFAULT_KEY):
         self._initial_value = val
+        self._key = key
+        self._store = None
         self._id = str(uuid.uuid4())
         self._token_manager = None
         self._manager = None
         self._lock = Lock()
+        self._use_lease = use_lease
+        self._cached_value = None
+        self._cached_version = None
+        self._lease_until = 0.0
+        self._same_host = False
+        self._segments = {}
         
-    def initialize_networking(self, host='localhost', port=50000):
-        BaseManager.register('TokenManager', TokenManager, 
-                           exposed=['acquire_tokens', 'release_tokens', 
-                                  'add_process', 'get_total_processes',
-                                  'get_shared_value', 'set_shared_value'])
-        
-        self._manager = BaseManager(address=(host, port), authkey=b'secret')
-        
-        try:
-            self._manager.connect()
-            self._token_manager = self._manager.TokenManager()
-            self._token_manager.add_process()
-        except:
-            self._manager.start()
-            self._token_manager = self._manager.TokenManager()
-            if self._initial_value is not None:
-                self._token_manager.set_shared_value(self._initial_value)
+    def initialize_networking(self, host='localhost', port=50000, num_shards=1, start=True):
+        # Shards listen on consecutive ports; unless start is False, any that
+        # isn't running yet is started by this process
+        self._same_host = host in LOCAL_HOSTS
+        self._store = ShardedStore([], client_id=self._id)
+        self._store.connect(shard_addresses(host, port, num_shards), start=start)
+        self._store.start_heartbeat()
+        self._token_manager = self._store.primary
+        if self._initial_value is not None:
+            self.write(self._initial_value)
+    
+    def _export(self, value):
+        if not self._same_host:
+            return None
+        return export_buffer(value)
+    
+    def _attach(self, descriptor):
+        # Map the segment once and hand out read-only views of it
+        shm = self._segments.get(descriptor.name)
+        if shm is None:
+            shm = _Segment(name=descriptor.name)
+            _untrack(shm)
+            self._release_segments()
+            self._segments[descriptor.name] = shm
+        view = shm.buf[:descriptor.nbytes].toreadonly()
+        if descriptor.dtype is not None and np is not None:
+            return np.frombuffer(view, dtype=descriptor.dtype).reshape(descriptor.shape)
+        return view.cast(descriptor.format, descriptor.shape)
+    
+    def _release_segments(self):
+        # Unmap segments nobody is looking at any more; ones with live
+        # views stay mapped until a later call
+        for name, shm in list(self._segments.items()):
+            try:
+                shm.close()
+            except BufferError:
+                continue
+            del self._segments[name]
             
     def read(self):
-        with self._lock:
-            self._token_manager.acquire_tokens(1)
+        return self.read_versioned()[0]
+    
+    def read_versioned(self):
+        while True:
+            value, version = self._read_raw()
+            if not isinstance(value, SharedBuffer):
+                return value, version
             try:
-                result = self._token_manager.get_shared_value()
-                return result
-            finally:
-                self._token_manager.release_tokens(1)
+                return self._attach(value), version
+            except FileNotFoundError:
+                # Replaced between reading the descriptor and mapping it
+                with self._lock:
+                    self._lease_until = 0.0
+    
+    def _read_raw(self):
+        with self._lock:
+            if not self._use_lease:
+                return self._store.call('read_versioned', self._key)
+            
+            # Serve from the local copy while the lease holds
+            now = time.monotonic()
+            if now < self._lease_until:
+                return self._cached_value, self._cached_version
+            
+            value, version, duration = self._store.call('read_lease', self._key,
+                                                        client_id=self._id)
+            # Count the lease from before the request so it never outlives
+            # the one the manager recorded
+            self._cached_value = value
+            self._cached_version = version
+            self._lease_until = now + duration
+            return value, version
     
     def write(self, value):
+        descriptor = self._export(value)
         with self._lock:
-            total_tokens = self._token_manager.get_total_processes()
-            self._token_manager.acquire_tokens(total_tokens)
+            self._lease_until = 0.0
             try:
-                self._token_manager.set_shared_value(value)
-            finally:
-                self._token_manager.release_tokens(total_tokens)
+                self._cached_version = self._store.call(
+                    'write_value', self._key, descriptor or value, client_id=self._id)
+            except Exception:
+                if descriptor is not None:
+                    unlink_buffer(descriptor.name)
+                raise
+    
+    def _update(self, method, *args):
+        # Atomic operations change the value behind our back, so drop the
+        # local copy before sending them
+        with self._lock:
+            self._lease_until = 0.0
+            return self._store.call(method, self._key, *args, client_id=self._id)
+    
+    def compare_and_swap(self, expected_version, value):
+        descriptor = self._export(value)
+        try:
+            result = self._update('compare_and_swap', expected_version, descriptor or value)
+        except Exception:
+            if descriptor is not None:
+                unlink_buffer(descriptor.name)
+            raise
+        if descriptor is not None and not result[0]:
+            unlink_buffer(descriptor.name)
+        return result
+    
+    def increment(self, delta=1):
+        return self._update('increment', delta)
+    
+    def append(self, item):
+        return self._update('append', item)
+    
+    def batch(self, ops):
+        # Large values given to set and compare_and_swap go through shared
+        # memory as with write(), and buffers in the results are mapped as
+        # with read()
+        ops = [tuple(op) for op in ops]
+        exported = {}
+        sent = []
+        for name, *args in ops:
+            if name in ('set', 'compare_and_swap') and args:
+                descriptor = self._export(args[-1])
+                if descriptor is not None:
+                    exported[descriptor.name] = args[-1]
+                    args[-1] = descriptor
+            sent.append((name, *args))
+        
+        try:
+            while True:
+                results = self._update('batch', sent)
+                try:
+                    resolved = [self._resolve(result, exported) for result in results]
+                    break
+                except FileNotFoundError:
+                    # Another client replaced the value after this batch
+                    # read it; the manager refuses batches that read a
+                    # buffer and change it, so this one changed nothing
+                    continue
+        except Exception:
+            for name in exported:
+                unlink_buffer(name)
+            raise
+        
+        # Only the last value stored by the batch is still in use
+        stored = None
+        for (name, *args), result in zip(sent, results):
+            if name in ('set', 'compare_and_swap') and (name == 'set' or result):
+                stored = args[-1]
+            elif name in ('increment', 'append'):
+                stored = None
+        for name in exported:
+            if not (isinstance(stored, SharedBuffer) and stored.name == name):
+                unlink_buffer(name)
+        return resolved
+    
+    def _resolve(self, result, exported):
+        if not isinstance(result, SharedBuffer):
+            return result
+        # A buffer this batch stored; the caller already has it
+        if result.name in exported:
+            return exported[result.name]
+        return self._attach(result)
+    
+    @contextmanager
+    def locked(self, write=True):
+        # Hold the key's lock across several calls. Inside the block use
+        # get()/set(), which don't take the lock again. If this process dies
+        # in here the manager takes the lock back once heartbeats stop.
+        mode = 'write' if write else 'read'
+        self._store.call(f'acquire_{mode}', self._key, client_id=self._id)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._lease_until = 0.0
+            self._store.call(f'release_{mode}', self._key, client_id=self._id)
+    
+    def get(self):
+        return self._store.call('get_shared_value', self._key)
+    
+    def set(self, value):
+        # Needs the write lock from locked()
+        with self._lock:
+            self._lease_until = 0.0
+        self._store.call('set_shared_value', self._key, value, client_id=self._id)
+    
+    def live_processes(self):
+        return self._token_manager.get_total_processes()
+    
+    def close(self):
+        self._store.close()
 
-def worker(process_id, port):
+def worker(process_id, port, num_shards=1):
     print(f"Process {process_id} starting...")
     try:
         dist_obj = DistObj(f"Initial value from process {process_id}" if process_id == 0 else None)
-        dist_obj.initialize_networking(port=port)
+        dist_obj.initialize_networking(port=port, num_shards=num_shards)
         
         # Perform some operations
         time.sleep(1)  # Give other processes time to start
@@ -129,17 +1102,77 @@ def worker(process_id, port):
         print(f"Process {process_id} encountered error: {str(e)}")
         print(traceback.format_exc())
 
-if __name__ == "__main__":
+def fault_worker(process_id, port, iterations, completed):
+    # Read-modify-write under an explicitly held lock, slowly enough that a
+    # kill is likely to land while the lock is held
+    dist_obj = DistObj(key='fault-counter')
+    dist_obj.initialize_networking(port=port)
+    for _ in range(iterations):
+        with dist_obj.locked():
+            value = dist_obj.get() or 0
+            time.sleep(0.05)
+            dist_obj.set(value + 1)
+        with completed.get_lock():
+            completed.value += 1
+    dist_obj.close()
+
+def run_fault_injection(base_port, num_workers=4, num_victims=2, iterations=40):
+    # Kill some workers mid-operation and check the rest still finish once
+    # the manager reclaims the dead workers' locks
+    print(f"Fault injection: {num_workers} workers, killing {num_victims}")
+    servers = start_servers(base_port=base_port)
+    completed = Value('i', 0)
+    processes = []
+    try:
+        monitor = DistObj(key='fault-counter', use_lease=False)
+        monitor.initialize_networking(port=base_port)
+        for i in range(num_workers):
+            p = Process(target=fault_worker, args=(i, base_port, iterations, completed))
+            processes.append(p)
+            p.start()
+        
+        time.sleep(1)
+        print(f"Live clients before kill: {monitor.live_processes()}")
+        killed_at = time.monotonic()
+        for p in processes[:num_victims]:
+            p.kill()
+            p.join()
+        
+        for p in processes[num_victims:]:
+            p.join(timeout=iterations * num_workers * 0.1 + CLIENT_TIMEOUT * 2)
+        stuck = [p for p in processes[num_victims:] if p.is_alive()]
+        elapsed = time.monotonic() - killed_at
+        
+        # Give the reaper time to drop the killed workers
+        time.sleep(CLIENT_TIMEOUT + HEARTBEAT_INTERVAL)
+        counter = monitor.read()
+        done = completed.value
+        # A victim can die after its write but before counting it
+        consistent = done <= counter <= done + num_victims
+        print(f"Survivors finished: {not stuck} ({elapsed:.1f}s after kill)")
+        print(f"Live clients after reaping: {monitor.live_processes()}")
+        print(f"Counter {counter}, completed updates {done}, consistent: {consistent}")
+        monitor.close()
+        return not stuck and consistent
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+        for server in servers:
+            server.shutdown()
+
+def run_demo(base_port, num_processes=3, num_shards=2):
     processes = []
-    base_port = 50000
-    num_processes = 3
     
     print("Starting distributed object demonstration...")
     
+    # The manager outlives the workers, so none of them has to host it
+    servers = start_servers(base_port=base_port, num_shards=num_shards)
+    
     try:
         # Start processes
         for i in range(num_processes):
-            p = Process(target=worker, args=(i, base_port))
+            p = Process(target=worker, args=(i, base_port, num_shards))
             processes.append(p)
             p.start()
             time.sleep(0.5)  # Delay between process starts
@@ -154,4 +1187,15 @@ if __name__ == "__main__":
             p.terminate()
             
     finally:
-        print("Demonstration completed.")
\ No newline at end of file
+        for server in servers:
+            server.shutdown()
+        print("Demonstration completed.")
+
+if __name__ == "__main__":
+    import sys
+    
+    args = sys.argv[1:]
+    base_port = int(args[args.index('--port') + 1]) if '--port' in args else 50000
+    if '--fault-injection' in args:
+        sys.exit(0 if run_fault_injection(base_port) else 1)
+    run_demo(base_port)
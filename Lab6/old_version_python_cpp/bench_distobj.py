@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from multiprocessing import Barrier, Process, Queue
+from threading import BrokenBarrierError
+
+from DistObj import DistObj, start_servers, shard_addresses, ShardedStore
+
+PROCESS_COUNTS = [1, 2, 4, 8, 16, 32, 64]
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def latency_summary(latencies):
+    """Percentiles in milliseconds"""
+    ms = sorted(x * 1000 for x in latencies)
+    if not ms:
+        return {'count': 0}
+    return {
+        'count': len(ms),
+        'mean_ms': sum(ms) / len(ms),
+        'p50_ms': percentile(ms, 50),
+        'p99_ms': percentile(ms, 99),
+        'p999_ms': percentile(ms, 99.9),
+        'max_ms': ms[-1],
+    }
+
+def bench_worker(process_id, args, ready, start, results):
+    try:
+        results.put(run_worker(process_id, args, ready, start))
+    except Exception as e:
+        # Don't leave the others waiting at a barrier this worker won't reach
+        ready.abort()
+        start.abort()
+        results.put({'error': f"worker {process_id}: {e!r}"})
+
+def run_worker(process_id, args, ready, start):
+    rng = random.Random(args.seed + process_id)
+    objs = []
+    for k in range(args.keys):
+        obj = DistObj(key=f"bench-{k}", use_lease=args.lease)
+        obj.initialize_networking(port=args.base_port, num_shards=args.shards, start=False)
+        objs.append(obj)
+    payload = 'x' * args.value_size
+    reads, writes = [], []
+    cas_failures = 0
+
+    ready.wait()
+    start.wait()
+    began = time.perf_counter()
+    deadline = began + args.duration
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        obj = objs[rng.randrange(len(objs))]
+        if rng.random() >= args.write_ratio:
+            obj.read()
+            reads.append(time.perf_counter() - now)
+            continue
+        if args.write_op == 'write':
+            obj.write(payload)
+        elif args.write_op == 'increment':
+            obj.increment()
+        else:
+            version = obj.read_versioned()[1]
+            if not obj.compare_and_swap(version, payload)[0]:
+                cas_failures += 1
+        writes.append(time.perf_counter() - now)
+    elapsed = time.perf_counter() - began
+
+    # Every object has its own connection and counters; add them up
+    rpc_stats = {}
+    for obj in objs:
+        for method, (calls, seconds) in obj._store.rpc_stats.items():
+            totals = rpc_stats.setdefault(method, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        obj.close()
+    return {'reads': reads, 'writes': writes, 'elapsed': elapsed,
+            'cas_failures': cas_failures, 'rpc_stats': rpc_stats}
+
+def run_level(args, num_processes):
+    """Run num_processes workers for args.duration seconds and summarise"""
+    ready = Barrier(num_processes + 1)
+    start = Barrier(num_processes + 1)
+    results = Queue()
+    processes = [Process(target=bench_worker, args=(i, args, ready, start, results))
+                 for i in range(num_processes)]
+    for p in processes:
+        p.start()
+
+    # Only count what happens once every worker is connected
+    admin = ShardedStore(shard_addresses(base_port=args.base_port, num_shards=args.shards))
+    try:
+        ready.wait()
+        for shard in admin.shards():
+            shard.reset_stats()
+        start.wait()
+    except BrokenBarrierError:
+        pass
+
+    outcomes = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    errors = [o['error'] for o in outcomes if 'error' in o]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+    server = {}
+    for shard in admin.shards():
+        for method, stats in shard.get_stats().items():
+            totals = server.setdefault(method, dict.fromkeys(stats, 0))
+            for name, value in stats.items():
+                totals[name] += value
+
+    reads = [x for o in outcomes for x in o['reads']]
+    writes = [x for o in outcomes for x in o['writes']]
+    ops = len(reads) + len(writes)
+    client = {}
+    for o in outcomes:
+        for method, (calls, seconds) in o['rpc_stats'].items():
+            totals = client.setdefault(method, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+
+    # Round trip = transport + service; service = lock/lease waits + work
+    rpc = {}
+    for method, (calls, seconds) in client.items():
+        stats = server.get(method, {})
+        service = stats.get('service_s', 0.0)
+        rpc[method] = {
+            'calls': calls,
+            'round_trip_s': seconds,
+            'service_s': service,
+            'lock_wait_s': stats.get('lock_wait_s', 0.0),
+            'lease_wait_s': stats.get('lease_wait_s', 0.0),
+            'transport_s': max(0.0, seconds - service),
+        }
+    rpc_calls = sum(r['calls'] for r in rpc.values())
+    round_trip = sum(r['round_trip_s'] for r in rpc.values())
+
+    return {
+        'processes': num_processes,
+        'ops': ops,
+        'throughput_ops': sum((len(o['reads']) + len(o['writes'])) / o['elapsed']
+                              for o in outcomes if o['elapsed'] > 0),
+        'all': latency_summary(reads + writes),
+        'read': latency_summary(reads),
+        'write': latency_summary(writes),
+        'cas_failures': sum(o['cas_failures'] for o in outcomes),
+        'rpc_per_op': rpc_calls / ops if ops else 0.0,
+        'rpc': rpc,
+        'time_split': {
+            'lock_wait_s': sum(r['lock_wait_s'] for r in rpc.values()),
+            'lease_wait_s': sum(r['lease_wait_s'] for r in rpc.values()),
+            'transport_s': sum(r['transport_s'] for r in rpc.values()),
+            'round_trip_s': round_trip,
+        },
+        'server_rpc': server,
+    }
+
+def format_level(result):
+    split = result['time_split']
+    total = split['round_trip_s'] or 1.0
+    return (f"{result['processes']:>4} {result['throughput_ops']:>11.0f} "
+            f"{result['all'].get('p50_ms') or 0:>8.3f} {result['all'].get('p99_ms') or 0:>8.3f} "
+            f"{result['all'].get('p999_ms') or 0:>8.3f} {result['rpc_per_op']:>7.2f} "
+            f"{100 * split['lock_wait_s'] / total:>6.1f}% {100 * split['lease_wait_s'] / total:>6.1f}% "
+            f"{100 * split['transport_s'] / total:>6.1f}%")
+
+def metadata(args):
+    """Run description stored next to the results"""
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': vars(args),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DistObj contention benchmark")
+    parser.add_argument('--processes', type=int, nargs='+', default=PROCESS_COUNTS)
+    parser.add_argument('--duration', type=float, default=2.0, help="seconds per process count")
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--write-op', choices=['write', 'increment', 'cas'], default='write')
+    parser.add_argument('--keys', type=int, default=1, help="distinct objects the workers share")
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--value-size', type=int, default=64, help="bytes per written value")
+    parser.add_argument('--lease', action='store_true', help="serve reads from leased local copies")
+    parser.add_argument('--base-port', type=int, default=50100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    servers = start_servers(base_port=args.base_port, num_shards=args.shards)
+    levels = []
+    try:
+        print(f"{'N':>4} {'ops/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} "
+              f"{'rpc/op':>7} {'lock':>7} {'lease':>7} {'wire':>7}")
+        for n in args.processes:
+            result = run_level(args, n)
+            levels.append(result)
+            print(format_level(result))
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(args), 'levels': levels}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
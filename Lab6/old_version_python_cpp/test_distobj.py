@@ -0,0 +1,233 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+
+from DistObj import (ClientExpired, DistObj, HashRing, LockNotHeld, SharedBuffer, ShardedStore, TokenManager, SHM_THRESHOLD,
+                     run_fault_injection, start_server, start_servers)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope='module')
+def port():
+    port = free_port()
+    servers = start_servers(base_port=port)
+    yield port
+    for server in servers:
+        server.shutdown()
+
+def client(port, key, **kwargs):
+    obj = DistObj(key=key, **kwargs)
+    obj.initialize_networking(port=port, start=False)
+    return obj
+
+def in_thread(func, *args, **kwargs):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', func(*args, **kwargs)))
+    thread.start()
+    return thread, result
+
+def test_own_lease_does_not_delay_write():
+    tm = TokenManager(lease_duration=5.0)
+    tm.read_lease('k', client_id='a')
+    start = time.monotonic()
+    tm.write_value('new', 'k', client_id='a')
+    assert time.monotonic() - start < 0.5
+
+def test_write_waits_for_other_leases_without_the_lock():
+    tm = TokenManager(lease_duration=0.5)
+    tm.write_value('old', 'k')
+    tm.read_lease('k', client_id='a')
+    start = time.monotonic()
+    writer, _ = in_thread(tm.write_value, 'new', 'k', client_id='b')
+    time.sleep(0.1)
+    # Reads still go through, but no lease is granted while the writer waits
+    assert tm.read_versioned('k') == ('old', 1)
+    assert tm.read_lease('k', client_id='c') == ('old', 1, 0.0)
+    assert time.monotonic() - start < 0.3
+    writer.join()
+    assert time.monotonic() - start >= 0.4
+    assert tm.read_lease('k', client_id='c') == ('new', 2, 0.5)
+
+def test_expired_leases_are_dropped():
+    tm = TokenManager(lease_duration=0.05)
+    for i in range(100):
+        tm.read_lease('k', client_id=f"c{i}")
+    time.sleep(0.1)
+    start = time.monotonic()
+    tm.write_value('new', 'k', client_id='w')
+    assert time.monotonic() - start < 0.05
+    assert tm._entry('k').leases == {}
+
+def test_lease_holder_sees_write_once_it_returns(port):
+    key = f"lease-{uuid.uuid4().hex}"
+    a = client(port, key, use_lease=True)
+    b = client(port, key)
+    try:
+        b.write('old')
+        assert a.read() == 'old'
+        start = time.monotonic()
+        b.write('new')
+        assert time.monotonic() - start < 0.5
+        assert a.read() == 'new'
+    finally:
+        a.close()
+        b.close()
+
+@pytest.fixture
+def two_shards():
+    # A running shard and a second one that hasn't joined the ring yet
+    old, new = ('localhost', free_port()), ('localhost', free_port())
+    servers = [start_server(*old), start_server(*new)]
+    yield old, new
+    for server in servers:
+        server.shutdown()
+
+def key_owned_by(address, nodes):
+    ring = HashRing(nodes)
+    return next(key for key in (f"key-{i}" for i in range(10000)) if ring.get(key) == address)
+
+def test_client_on_old_ring_writes_to_new_owner(two_shards):
+    old, new = two_shards
+    a = ShardedStore([old])
+    b = ShardedStore([old])
+    key = key_owned_by(new, [old, new])
+    a.add_shard(new)
+    # b still routes the key to the old shard, which must not create it
+    b.call('write_value', key, 'from-b')
+    assert a.call('read_value', key) == 'from-b'
+    assert key not in b.primary.keys()
+
+def test_write_during_handover_is_not_overwritten(two_shards):
+    old, new = two_shards
+    a = ShardedStore([old])
+    b = ShardedStore([old])
+    key = key_owned_by(new, [old, new])
+    a.call('write_value', key, 'before')
+    
+    # add_shard, stopped between taking the key off the old shard and
+    # installing it on the new one
+    source = a.primary
+    target = a._attach(new)
+    nodes = [old, new]
+    target.set_ring(nodes, new, importing=True)
+    source.set_ring(nodes, old)
+    value, version = source.pop_entry(key, new)
+    
+    writer, result = in_thread(b.call, 'write_value', key, 'from-b')
+    time.sleep(0.3)
+    # b was sent on to the new shard, which holds it until the key arrives
+    assert writer.is_alive()
+    target.import_entry(key, value, version)
+    target.finish_import()
+    writer.join(5)
+    assert result['value'] == version + 1
+    assert a.call('read_versioned', key) == ('from-b', version + 1)
+
+BIG = bytes(range(256)) * (SHM_THRESHOLD // 256 + 1)
+
+@pytest.fixture
+def buffer_obj(port):
+    obj = client(port, f"buffer-{uuid.uuid4().hex}")
+    yield obj
+    obj.close()
+
+def test_atomic_ops_reject_shared_buffers(buffer_obj):
+    buffer_obj.write(BIG)
+    with pytest.raises(TypeError, match="shared memory"):
+        buffer_obj.increment()
+    with pytest.raises(TypeError, match="shared memory"):
+        buffer_obj.append(1)
+    assert bytes(buffer_obj.read()) == BIG
+
+def test_batch_maps_shared_buffers(buffer_obj):
+    buffer_obj.write(BIG)
+    result, = buffer_obj.batch([('get',)])
+    assert bytes(result) == BIG
+
+def test_batch_set_uses_shared_memory(buffer_obj):
+    other = BIG[::-1]
+    assert buffer_obj.batch([('set', other), ('get',)]) == [None, other]
+    assert isinstance(buffer_obj.get(), SharedBuffer)
+    assert bytes(buffer_obj.read()) == other
+
+def test_batch_cannot_read_and_replace_a_buffer(buffer_obj):
+    buffer_obj.write(BIG)
+    version = buffer_obj.read_versioned()[1]
+    with pytest.raises(ValueError, match="read it first"):
+        buffer_obj.batch([('get',), ('set', 'small')])
+    assert buffer_obj.read_versioned()[1] == version
+    assert bytes(buffer_obj.read()) == BIG
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason="needs /dev/shm to count segments")
+def test_batch_unlinks_buffers_it_did_not_store(buffer_obj):
+    buffer_obj.write('small')
+    before = set(os.listdir('/dev/shm'))
+    assert buffer_obj.batch([('compare_and_swap', -1, BIG), ('set', BIG), ('set', 'x')]) \
+        == [False, None, None]
+    assert set(os.listdir('/dev/shm')) - before == set()
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason="needs /dev/shm to count segments")
+def test_shutdown_unlinks_current_buffers():
+    before = set(os.listdir('/dev/shm'))
+    port = free_port()
+    server = start_server(port=port)
+    try:
+        for key in ('big-a', 'big-b'):
+            obj = client(port, key)
+            try:
+                obj.write(BIG)
+                obj.write(BIG[::-1])
+            finally:
+                obj.close()
+        assert len(set(os.listdir('/dev/shm')) - before) == 2
+    finally:
+        server.shutdown()
+    assert set(os.listdir('/dev/shm')) - before == set()
+
+def test_set_under_lock_waits_for_leases(port):
+    key = f"locked-{uuid.uuid4().hex}"
+    a = client(port, key)
+    b = client(port, key, use_lease=True)
+    try:
+        a.write('old')
+        assert b.read() == 'old'
+        with a.locked():
+            a.set('new')
+        assert b.read() == 'new'
+    finally:
+        a.close()
+        b.close()
+
+def test_set_needs_the_write_lock(port):
+    key = f"fenced-{uuid.uuid4().hex}"
+    a = client(port, key)
+    try:
+        with pytest.raises(LockNotHeld):
+            a.set('x')
+        with a.locked(write=False):
+            with pytest.raises(LockNotHeld):
+                a.set('x')
+        assert a.read() is None
+    finally:
+        a.close()
+
+def test_expired_client_cannot_set():
+    tm = TokenManager()
+    tm.register_client('a')
+    tm.acquire_write('k', client_id='a')
+    # What the reaper does once a's heartbeats stop
+    tm._drop_clients(['a'])
+    with pytest.raises(ClientExpired):
+        tm.set_shared_value('late', 'k', client_id='a')
+    assert tm.get_shared_value('k') is None
+
+def test_survivors_finish_after_workers_are_killed():
+    # Enough work that the victim is killed while the others still run
+    assert run_fault_injection(free_port(), num_workers=3, num_victims=1, iterations=20)